@@ -0,0 +1,242 @@
+import atexit
+import csv
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+import config
+
+
+def attendanceFilePath(now=None):
+    '''
+    Path of the attendance CSV for the day of `now`
+
+    args:
+    now: datetime, defaults to the current time
+    '''
+    if now is None:
+        now = datetime.now()
+    return os.path.join(config.ATTENDANCE_DIR, f"Attendance_{now.strftime('%y_%m_%d')}.csv")
+
+
+class AttendanceLog:
+    '''
+    In-memory record of who was already marked today
+
+    Lets the camera loop skip the CSV entirely for people inside their
+    cooldown window. With cooldown=None a person is marked once per day.
+
+    args:
+    cooldown_minutes: float or None
+    '''
+
+    def __init__(self, cooldown_minutes=None):
+        self.cooldown = None if cooldown_minutes is None else timedelta(minutes=cooldown_minutes)
+        self.day = None
+        self.last_seen = {}
+
+    def _rollover(self, now):
+        if self.day != now.date():
+            self.day = now.date()
+            self.last_seen = {}
+
+    def loadDay(self, attendance_file=None, now=None):
+        '''
+        Rebuild the seen-set from the rows already in today's attendance file
+
+        args:
+        attendance_file: str, defaults to today's file
+        now: datetime, defaults to the current time
+        '''
+        if now is None:
+            now = datetime.now()
+        if attendance_file is None:
+            attendance_file = attendanceFilePath(now)
+        self._rollover(now)
+        if not os.path.exists(attendance_file):
+            return
+        with open(attendance_file, newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    seen = datetime.strptime(f"{row['Date']} {row['Time']}", '%Y-%m-%d %H:%M:%S')
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if seen.date() != self.day:
+                    continue
+                name = row['Name']
+                if name not in self.last_seen or seen > self.last_seen[name]:
+                    self.last_seen[name] = seen
+        print(f"Loaded {len(self.last_seen)} people already marked today")
+
+    def shouldMark(self, name, now=None):
+        '''
+        True if `name` has to be written now, and records it as seen
+
+        args:
+        name: str
+        now: datetime, defaults to the current time
+        '''
+        if now is None:
+            now = datetime.now()
+        self._rollover(now)
+        last = self.last_seen.get(name)
+        if last is not None and (self.cooldown is None or now - last < self.cooldown):
+            return False
+        self.last_seen[name] = now
+        return True
+
+
+class AttendanceWriter:
+    '''
+    Background CSV sink for attendance rows
+
+    The camera loop only puts (name, time) on a queue. A writer thread keeps
+    the day's file open, writes rows in batches every flush_interval seconds
+    or once batch_size rows are waiting, and switches to a new file when the
+    date of a row changes. Remaining rows are flushed by close(), which is
+    also registered with atexit.
+
+    With several cameras there is still only one writer, and camera_column
+    adds a "Camera" column saying where the person was seen.
+
+    args:
+    flush_interval: float, seconds a row may wait before it is written
+    batch_size: int, number of waiting rows that triggers an early flush
+    camera_column: bool
+    '''
+
+    _STOP = object()
+
+    def __init__(self, flush_interval=1.0, batch_size=32, camera_column=False):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.camera_column = camera_column
+        self.header = ["Name", "Time", "Date"] + (["Camera"] if camera_column else [])
+        self.queue = queue.Queue()
+        self._file = None
+        self._writer = None
+        self._columns = self.header
+        self._day = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, name, now=None, camera=None):
+        '''
+        Queue one attendance row, never blocks on disk
+
+        args:
+        name: str
+        now: datetime, defaults to the current time
+        camera: camera id, only written with camera_column
+        '''
+        if now is None:
+            now = datetime.now()
+        self.queue.put((name, now, camera))
+
+    def close(self):
+        '''
+        Write all queued rows and close the file
+        '''
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if pending else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                break
+            if item is not None:
+                if not pending:
+                    deadline = time.monotonic() + self.flush_interval
+                pending.append(item)
+            if pending and (item is None or len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                self._writeRows(pending)
+                pending = []
+        self._writeRows(pending)
+        self._closeFile()
+
+    def _openDay(self, now):
+        self._closeFile()
+        os.makedirs(config.ATTENDANCE_DIR, exist_ok=True)
+        attendance_file = attendanceFilePath(now)
+        self._columns = self._existingHeader(attendance_file) or self.header
+        if self._columns != self.header:
+            # e.g. CAMERAS was switched on or off during the day, keep the file's own layout
+            print(f"Warning: {attendance_file} has columns {self._columns}, writing rows in that layout")
+        self._file = open(attendance_file, 'a', newline='')
+        self._writer = csv.writer(self._file)
+        if self._file.tell() == 0:
+            self._writer.writerow(self.header)
+            print(f"Created new attendance file for today: {attendance_file}")
+        self._day = now.date()
+
+    def _existingHeader(self, attendance_file):
+        # Header row of a file that already has content, None for a new or empty file
+        try:
+            with open(attendance_file, newline='') as f:
+                return next(csv.reader(f), None)
+        except OSError:
+            return None
+
+    def _closeFile(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._writer = None
+        self._day = None
+
+    def _writeRows(self, rows):
+        if not rows:
+            return
+        # Rows already handed to the day file, only the rest go to the backup on an error
+        written = 0
+        try:
+            for row in rows:
+                if self._day != row[1].date():
+                    self._openDay(row[1])
+                self._writer.writerow(self._formatRow(row, self._columns))
+                written += 1
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            for name, now, _ in rows:
+                print(f"Logged attendance for {name} at {now.strftime('%H:%M:%S')}")
+        except Exception as e:
+            print(f"Error marking attendance: {e}")
+            self._closeFile()
+            self._writeBackup(rows[written:])
+
+    def _formatRow(self, row, columns=None):
+        name, now, camera = row
+        values = {'Name': name, 'Time': now.strftime('%H:%M:%S'), 'Date': now.strftime('%Y-%m-%d'),
+                  'Camera': camera if self.camera_column else ''}
+        return [values.get(column, '') for column in (columns or self.header)]
+
+    def _writeBackup(self, rows):
+        # If there's an error, try using a backup file
+        if not rows:
+            return
+        try:
+            backup_file = os.path.join(config.ATTENDANCE_DIR, "Attendance_Backup.csv")
+            columns = self._existingHeader(backup_file) or self.header
+            with open(backup_file, 'a', newline='') as f:
+                writer = csv.writer(f)
+                if f.tell() == 0:  # If file is empty, write header
+                    writer.writerow(self.header)
+                for row in rows:
+                    writer.writerow(self._formatRow(row, columns))
+            print("Logged to backup file instead")
+        except Exception as backup_error:
+            print(f"Failed to write to backup file: {backup_error}")
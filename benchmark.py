@@ -0,0 +1,189 @@
+import argparse
+import csv
+import resource
+import time
+
+import cv2
+import numpy as np
+
+import config
+from attendance import AttendanceLog
+from capture import SequentialCapture
+from detection import AdaptiveScaler, DetectionZone, MotionGate, RoiDetector, buildDetector
+from frame_source import ImageFolderSource, SyntheticSource, VideoFileSource
+from gallery import listGalleryFiles, loadGallery
+from gallery_index import buildGalleryIndex
+from recognition import buildRecognitionPipeline
+from tracker import FaceTracker
+
+
+def readGroundTruth(path):
+    '''
+    Labelled ground truth for a recording
+
+    CSV with a header "frame,names": frame is the 1-based frame number and
+    names the people visible in it separated by ";". Frames that are not
+    listed are treated as showing nobody.
+
+    returns:
+    dict frame number -> set of upper-case names
+    '''
+    truth = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            names = {n.strip().upper() for n in row['names'].split(';') if n.strip()}
+            truth[int(row['frame'])] = names
+    return truth
+
+
+def rssMB():
+    '''
+    Current resident set size from /proc, in MB
+    '''
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recording through the attendance recognition pipeline")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--video", help="video file to replay")
+    source.add_argument("--frames", help="folder of frame images, replayed in file name order")
+    source.add_argument("--synthetic", type=int, metavar="N",
+                        help="N generated frames with the gallery images sliding across")
+    parser.add_argument("--width", type=int, help="resize frames to this width (needs --height)")
+    parser.add_argument("--height", type=int, help="resize frames to this height (needs --width)")
+    parser.add_argument("--ground-truth", help="CSV with frame,names columns for accuracy")
+    parser.add_argument("--no-tracking", action="store_true", help="encode every face on every frame")
+    parser.add_argument("--detect-interval", type=int, default=config.DETECT_INTERVAL,
+                        help="frames between HOG runs, 1 = every frame")
+    parser.add_argument("--no-roi", action="store_true", help="always search the whole frame")
+    parser.add_argument("--no-motion-gate", action="store_true", help="run detection even when nothing moves")
+    parser.add_argument("--fixed-scale", action="store_true", help="detect on the quarter-size frame only")
+    args = parser.parse_args()
+
+    classNames, encodeListKnown, _ = loadGallery(config.GALLERY_PATH)
+    galleryIndex = buildGalleryIndex(classNames, encodeListKnown)
+    print(f"Gallery: {len(galleryIndex)} faces")
+
+    if args.video:
+        cap = VideoFileSource(args.video, args.width, args.height)
+    elif args.frames:
+        cap = ImageFolderSource(args.frames, args.width, args.height)
+    else:
+        faces = [cv2.imread(f"{config.GALLERY_PATH}/{f}") for f in listGalleryFiles(config.GALLERY_PATH)[:3]]
+        cap = SyntheticSource(args.width or 640, args.height or 480, count=args.synthetic, faces=faces)
+    cap = SequentialCapture(cap)
+
+    tracker = None
+    if not args.no_tracking:
+        tracker = FaceTracker(config.TRACK_IOU_THRESHOLD, config.TRACK_REVERIFY_FRAMES,
+                              config.TRACK_UNKNOWN_RETRY_FRAMES, config.TRACK_MAX_MISSES)
+    detector = buildDetector(args.detect_interval, config.DETECT_ROI and not args.no_roi)
+    scaler = None
+    if not args.fixed_scale:
+        scaler = AdaptiveScaler(config.DETECT_SCALES, config.DETECT_TARGET_FACE_PX, config.DETECT_MIN_FACE_PX,
+                                config.DETECT_SCALE_PATIENCE)
+
+    gate = None
+    if config.MOTION_GATE and not args.no_motion_gate:
+        gate = MotionGate(config.MOTION_PIXEL_THRESHOLD, config.MOTION_MIN_AREA, config.MOTION_HOLD_FRAMES,
+                          config.MOTION_FORCE_SECONDS)
+    zone = None
+    if config.DETECT_ZONES and config.DETECT_ZONES.get(None):
+        zone = DetectionZone(config.DETECT_ZONES[None])
+
+    # Same record stage as main.py, rows are collected instead of written to the CSV
+    marked = []
+    attendanceLog = AttendanceLog(config.ATTENDANCE_COOLDOWN_MINUTES)
+    pipeline = buildRecognitionPipeline(cap, galleryIndex, attendanceLog, lambda name, camera: marked.append(name),
+                                        {None: tracker} if tracker is not None else None,
+                                        {None: detector} if detector is not None else None,
+                                        {None: scaler} if scaler is not None else None,
+                                        {None: zone} if zone is not None else None,
+                                        {None: gate} if gate is not None else None)
+
+    # CPU time over the same window as elapsed, gallery encoding and index training left out
+    cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    pipeline.start()
+    predictions = {}
+    end_to_end = []
+    last_output = start
+    while True:
+        # Generous timeout so a slow HOG run is not mistaken for the end of the replay
+        job = pipeline.get(timeout=5.0)
+        if job is None:
+            if cap.ended:
+                break
+            continue
+        last_output = time.perf_counter()
+        end_to_end.append(time.time() - job['timestamp'])
+        predictions[job['seq']] = {name for _, name, _ in job['matches']}
+    # Up to the last finished frame, not including the final timeout
+    elapsed = max(last_output - start, 1e-9)
+    cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+    pipeline.stop()
+    cap.release()
+
+    # The track stage drops frames the parallel detectors finished out of order
+    frames = len(predictions)
+    fed = cap.frames_read
+    cpu = (cpu_end.ru_utime - cpu_start.ru_utime) + (cpu_end.ru_stime - cpu_start.ru_stime)
+    print(f"\nFrames: {frames} of {fed} in {elapsed:.2f}s = {frames / elapsed:.2f} fps "
+          f"({fed - frames} dropped by the pipeline)")
+    print(f"CPU: {cpu:.2f}s ({cpu / elapsed:.0%} of one core), RSS: {rssMB():.0f} MB, "
+          f"peak RSS: {cpu_end.ru_maxrss / 1024:.0f} MB")
+
+    print(f"\n{'stage':<12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, (p50, p95, p99) in pipeline.latencyPercentiles().items():
+        print(f"{name:<12}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}")
+    if end_to_end:
+        p50, p95, p99 = np.percentile(end_to_end, (50, 95, 99)) * 1000
+        print(f"{'end-to-end':<12}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}")
+    # Same window as the summary, the idle end-of-replay timeout is not counted
+    pipeline.printStats(elapsed)
+    if detector is not None:
+        print(f"Detector runs: {detector.stats()['detector_runs']} of {detector.stats()['frames']} frames")
+        if isinstance(detector.detect_fn, RoiDetector):
+            stats = detector.detect_fn.stats()
+            print(f"Full-frame searches: {stats['full_runs']} of {stats['frames']}, "
+                  f"{stats['scanned']:.0%} of the frame searched on average")
+    if scaler is not None:
+        print(f"Final detection scale: {scaler.scale}")
+    if gate is not None:
+        stats = gate.stats()
+        print(f"Motion gate skipped {stats['skipped']:.0%} of {stats['frames']} frames "
+              f"({stats['gate_ms']:.2f} ms per frame)")
+    if tracker is not None:
+        print(f"Encodes skipped by tracking: {tracker.stats()['skipped']:.0%}")
+    print(f"Attendance rows: {len(marked)} ({', '.join(sorted(set(marked)))})")
+
+    if args.ground_truth:
+        truth = readGroundTruth(args.ground_truth)
+        tp = fp = fn = 0
+        # Every replayed frame is scored, one the pipeline dropped predicted nobody
+        for seq in range(1, fed + 1):
+            predicted = predictions.get(seq, set())
+            expected = truth.get(seq, set())
+            tp += len(predicted & expected)
+            fp += len(predicted - expected)
+            fn += len(expected - predicted)
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        people = set().union(*truth.values()) if truth else set()
+        labelled = sum(1 for seq in truth if seq <= fed)
+        print(f"\nPer-frame precision: {precision:.3f}, recall: {recall:.3f} "
+              f"over {fed} frames ({labelled} labelled, {fed - frames} dropped frames scored as empty)")
+        print(f"People marked: {len(set(marked) & people)} of {len(people)}, "
+              f"wrongly marked: {sorted(set(marked) - people)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import time
+import argparse
+import numpy as np
+
+from gallery_index import GalleryIndex, IVFGalleryIndex
+
+
+def syntheticGallery(n, queries, noise, seed=0):
+    '''
+    Random unit-scale 128-d "encodings" plus noisy copies of some of them as probes
+
+    dlib encodings of one person usually lie within ~0.3 of each other, so the
+    default noise keeps the probe close to its source row like a real re-capture.
+    '''
+    rng = np.random.default_rng(seed)
+    gallery = rng.normal(size=(n, 128)).astype(np.float32)
+    gallery /= np.linalg.norm(gallery, axis=1, keepdims=True)
+    truth = rng.integers(0, n, size=queries)
+    probes = gallery[truth] + rng.normal(scale=noise / np.sqrt(128), size=(queries, 128)).astype(np.float32)
+    return gallery, probes
+
+
+def timePerQuery(index, probes):
+    start = time.perf_counter()
+    for p in probes:
+        index.matchBatch(p)
+    return (time.perf_counter() - start) / len(probes) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency of the gallery matcher backends")
+    parser.add_argument("--gallery", type=int, default=20000, help="number of enrolled encodings")
+    parser.add_argument("--queries", type=int, default=500, help="number of probe encodings")
+    parser.add_argument("--noise", type=float, default=0.3, help="distance of a probe from its source")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF cells (default sqrt(gallery))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    gallery, probes = syntheticGallery(args.gallery, args.queries, args.noise)
+    names = [str(i) for i in range(len(gallery))]
+
+    exact = GalleryIndex(names, gallery)
+    exact_best, _ = exact.matchBatch(probes)
+    print(f"gallery={args.gallery} queries={args.queries}")
+    print(f"{'backend':<16}{'recall@1':>10}{'ms/query':>10}")
+    print(f"{'exact':<16}{1.0:>10.3f}{timePerQuery(exact, probes):>10.3f}")
+
+    start = time.perf_counter()
+    ivf = IVFGalleryIndex(names, gallery, nlist=args.nlist)
+    print(f"(IVF build with nlist={ivf.nlist}: {time.perf_counter() - start:.2f}s)")
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        best, _ = ivf.matchBatch(probes)
+        recall = np.mean(best == exact_best)
+        print(f"{'ivf nprobe=' + str(nprobe):<16}{recall:>10.3f}{timePerQuery(ivf, probes):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import threading
+import time
+
+
+class ThreadedCapture:
+    '''
+    Reads a camera on its own thread and only keeps the newest frame
+
+    cv2.VideoCapture buffers frames internally, so a slow recognition loop
+    that calls cap.read() itself gets frames that are already seconds old.
+    Here the capture thread drains the camera as fast as it delivers and
+    overwrites a single slot. read() returns the newest frame it has not
+    returned before; frames that were replaced before anyone read them are
+    counted in frames_dropped.
+
+    args:
+    cap: FrameSource or opened cv2.VideoCapture (anything with read() and release())
+    '''
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.frames_captured = 0
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self._frame = None
+        self._timestamp = None
+        self._seq = 0
+        self._last_read_seq = 0
+        self._running = True
+        self._ended = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            success, frame = self.cap.read()
+            timestamp = time.time()
+            with self._cond:
+                if not success:
+                    self._ended = True
+                    self._cond.notify_all()
+                    return
+                if self._seq > self._last_read_seq:
+                    # Previous frame was never read
+                    self.frames_dropped += 1
+                self._frame = frame
+                self._timestamp = timestamp
+                self._seq += 1
+                self.frames_captured += 1
+                self._cond.notify_all()
+
+    @property
+    def ended(self):
+        '''
+        True once the camera stopped delivering frames
+        '''
+        return self._ended
+
+    def readLatest(self, timeout=None):
+        '''
+        Wait for a frame newer than the last one returned
+
+        args:
+        timeout: float seconds, None waits forever
+
+        returns:
+        (success, frame, seq, timestamp), success is False when the camera stopped or on timeout
+        '''
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._last_read_seq or self._ended or not self._running,
+                                       timeout):
+                return False, None, self._last_read_seq, None
+            if self._seq <= self._last_read_seq:
+                return False, None, self._last_read_seq, None
+            self._last_read_seq = self._seq
+            self.frames_read += 1
+            return True, self._frame, self._seq, self._timestamp
+
+    def read(self, timeout=None):
+        '''
+        Drop-in replacement for cv2.VideoCapture.read()
+
+        returns:
+        (success, frame)
+        '''
+        success, frame, _, _ = self.readLatest(timeout)
+        return success, frame
+
+    def stats(self):
+        '''
+        Dict with captured, read and dropped frame counters
+        '''
+        with self._cond:
+            return {
+                'captured': self.frames_captured,
+                'read': self.frames_read,
+                'dropped': self.frames_dropped,
+            }
+
+    def release(self):
+        '''
+        Stop the capture thread and release the camera
+        '''
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout=2.0)
+        self.cap.release()
+
+
+class SequentialCapture:
+    '''
+    Same interface as ThreadedCapture but returns every frame in order
+
+    Used to replay a recording: nothing is dropped, the pipeline's
+    backpressure sets the pace, so runs are repeatable.
+
+    args:
+    cap: FrameSource or cv2.VideoCapture
+    '''
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.frames_read = 0
+        self._ended = False
+        self._lock = threading.Lock()
+
+    @property
+    def ended(self):
+        return self._ended
+
+    def readLatest(self, timeout=None):
+        with self._lock:
+            if self._ended:
+                return False, None, self.frames_read, None
+            success, frame = self.cap.read()
+            if not success:
+                self._ended = True
+                return False, None, self.frames_read, None
+            self.frames_read += 1
+            return True, frame, self.frames_read, time.time()
+
+    def read(self, timeout=None):
+        success, frame, _, _ = self.readLatest(timeout)
+        return success, frame
+
+    def stats(self):
+        return {'captured': self.frames_read, 'read': self.frames_read, 'dropped': 0}
+
+    def release(self):
+        self.cap.release()
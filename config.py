@@ -0,0 +1,118 @@
+'''
+Shared settings for the attendance scripts.
+
+Edit the values here instead of the constants inside each script.
+'''
+
+# Folder with one enrolled image per person (file name = person name)
+GALLERY_PATH = "Attendance_data"
+
+# Image types that are treated as gallery entries
+GALLERY_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# On-disk cache of gallery encodings, so main.py does not re-encode on every start
+ENCODING_CACHE_FILE = "Attendance_cache/encodings.npz"
+
+# Gallery matcher: "exact" scans every encoding, "ivf" only searches the
+# IVF_NPROBE closest of IVF_NLIST clusters (see benchmark_matcher.py)
+MATCHER_BACKEND = "exact"
+IVF_NLIST = None        # None = sqrt(gallery size)
+IVF_NPROBE = 8
+IVF_MIN_GALLERY = 2000  # smaller galleries always use the exact scan
+
+# Folder with one attendance CSV per day
+ATTENDANCE_DIR = "Attendance_Entry"
+
+# Minutes before the same person is written to the CSV again,
+# None = only the first sighting of the day is recorded
+ATTENDANCE_COOLDOWN_MINUTES = None
+
+# Background attendance writer: rows are written at least every
+# ATTENDANCE_FLUSH_SECONDS, or earlier once ATTENDANCE_BATCH_SIZE are queued
+ATTENDANCE_FLUSH_SECONDS = 1.0
+ATTENDANCE_BATCH_SIZE = 32
+
+# Recognition pipeline: worker threads per stage and the capacity of the
+# queue in front of each stage (small = low latency, frames are dropped)
+DETECT_WORKERS = 2
+ENCODE_WORKERS = 2
+PIPELINE_QUEUE_SIZE = 2
+PIPELINE_STATS_SECONDS = 10.0   # print per-stage stats this often, 0 = only on exit
+
+# Face tracking: a tracked face is only re-encoded every TRACK_REVERIFY_FRAMES
+# frames once recognised (every TRACK_UNKNOWN_RETRY_FRAMES while unknown)
+TRACKING_ENABLED = True
+TRACK_IOU_THRESHOLD = 0.3
+TRACK_REVERIFY_FRAMES = 30
+TRACK_UNKNOWN_RETRY_FRAMES = 5
+TRACK_MAX_MISSES = 5
+
+# Detection interval: HOG runs every DETECT_INTERVAL frames and boxes are moved
+# by template matching in between. The interval adapts between MIN and MAX
+# to the face motion (shift per frame as a fraction of the box size).
+# DETECT_INTERVAL = 1 runs HOG on every frame with DETECT_WORKERS threads.
+DETECT_INTERVAL = 5
+DETECT_INTERVAL_MIN = 1
+DETECT_INTERVAL_MAX = 15
+DETECT_MOTION_THRESHOLD = 0.15
+PROPAGATE_MIN_SCORE = 0.6
+
+# Detection scale per camera, chosen from the face sizes of the last frame
+# (see detection.AdaptiveScaler). The smallest face should be about
+# DETECT_TARGET_FACE_PX tall in the detection image; with no face in view
+# faces down to DETECT_MIN_FACE_PX (full frame) are looked for.
+# (0.25,) keeps the fixed quarter-size frame.
+DETECT_SCALES = (0.25, 0.35, 0.5, 0.75, 1.0)
+DETECT_TARGET_FACE_PX = 60
+DETECT_MIN_FACE_PX = 120
+DETECT_SCALE_PATIENCE = 10
+
+# Search only windows around the last faces (DETECT_ROI_MARGIN of the box
+# size on every side), the whole frame every DETECT_FULL_FRAME_INTERVAL runs
+DETECT_ROI = True
+DETECT_ROI_MARGIN = 0.5
+DETECT_FULL_FRAME_INTERVAL = 10
+
+# Only faces inside these zones count: camera id -> polygon of (x, y) points
+# as fractions of the frame width and height. The frame is cropped to the
+# zone before detection. The single camera of CAMERAS = None has id None,
+# e.g. {None: [(0.3, 0.1), (0.7, 0.1), (0.7, 1.0), (0.3, 1.0)]}.
+# None (or a camera left out) uses the whole frame.
+DETECT_ZONES = None
+
+# Skip detection while the scene is empty and still (see detection.MotionGate):
+# a frame counts as moving when more than MOTION_MIN_AREA of it changed by
+# more than MOTION_PIXEL_THRESHOLD grey levels. The gate closes after
+# MOTION_HOLD_FRAMES quiet frames and still checks every MOTION_FORCE_SECONDS.
+MOTION_GATE = True
+MOTION_PIXEL_THRESHOLD = 25
+MOTION_MIN_AREA = 0.002
+MOTION_HOLD_FRAMES = 15
+MOTION_FORCE_SECONDS = 5.0
+
+# Camera used by the scripts (see frame_source.py). CAMERA_BACKEND is a
+# cv2.CAP_* constant: 0 = CAP_ANY, 700 = CAP_DSHOW on Windows.
+# Width/height/fps of None keep the camera defaults.
+CAMERA_INDEX = 0
+CAMERA_BACKEND = 0
+CAMERA_WIDTH = None
+CAMERA_HEIGHT = None
+CAMERA_FPS = None
+
+# Several entrances in one process: camera id -> index, video file or stream
+# URL, e.g. {"front": 0, "back": "rtsp://10.0.0.5/stream"}. None uses
+# CAMERA_INDEX only. With cameras listed, attendance rows get a Camera column.
+CAMERAS = None
+
+# Processes used to encode gallery images at startup, None = one per CPU core.
+# Only where processes fork (Linux), elsewhere images are encoded one by one
+ENROLL_WORKERS = None
+
+# Reload Attendance_data while main.py runs (inotify if inotify_simple is
+# installed, otherwise the folder is polled every GALLERY_POLL_SECONDS)
+GALLERY_WATCH = True
+GALLERY_POLL_SECONDS = 2.0
+
+# People with several stored encodings (one per enrollment pose):
+# "min" matches against every encoding, "centroid" against their mean
+GALLERY_AGGREGATION = "min"
@@ -0,0 +1,55 @@
+import cv2
+
+import config
+from deepface_gallery import DeepFaceGallery
+from frame_source import CameraSource
+from verification_worker import LatestFrameWorker
+
+folder_path = "/home/vk/Desktop/CVpractise/face_recognition/data"  # Replace with the path to your image folder
+# Reference faces are embedded once, each check is one embedding plus a matrix search
+gallery = DeepFaceGallery(folder_path)
+print(f"Embedded {len(gallery)} reference faces in {gallery.embed_seconds:.1f}s")
+
+cap = CameraSource(config.CAMERA_INDEX, width=640, height=480)
+
+counter = 0
+
+
+def check_face(frame):
+    try:
+        name, _ = gallery.identify(frame)
+        return name is not None
+    except ValueError:
+        return False
+
+
+# One verification thread; a frame still waiting when the next one comes is dropped
+worker = LatestFrameWorker(check_face)
+
+
+while True:
+    ret, frame = cap.read()
+
+    if ret:
+        if counter % 30 == 0:
+            worker.submit(counter, frame.copy(), cap.timestamp)
+        counter += 1
+        # Result of the newest frame that finished checking
+        face_match = worker.result().value
+        if face_match:
+            cv2.putText(frame, "MATCH!", (20, 450), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 255, 0), 3)
+        else:
+            cv2.putText(frame, "NO MATCH!", (20, 450), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 3)
+
+        cv2.imshow('video', frame)
+
+    key = cv2.waitKey(0)
+    if key == ord('q'):
+        break
+
+worker.close()
+stats = worker.stats()
+print(f"Checks: {stats['checked']} of {stats['submitted']} submitted frames, {stats['dropped']} superseded, "
+      f"capture to result p50 {stats['p50_ms']:.0f} ms / p95 {stats['p95_ms']:.0f} ms")
+cap.release()
+cv2.destroyAllWindows()
@@ -0,0 +1,107 @@
+import os
+import time
+
+import cv2
+import numpy as np
+from deepface import DeepFace
+
+try:
+    from deepface.modules.verification import find_threshold
+except ImportError:
+    # deepface < 0.0.80
+    from deepface.commons.distance import findThreshold as find_threshold
+
+
+def representFace(img, model_name, detector_backend, enforce_detection=True):
+    '''
+    Embedding of the first face DeepFace.represent finds in img, as a float32 vector
+
+    Handles both return styles of DeepFace.represent (a list of dicts in
+    current versions, the bare embedding in old ones).
+    '''
+    result = DeepFace.represent(img, model_name=model_name, detector_backend=detector_backend,
+                                enforce_detection=enforce_detection)
+    if len(result) > 0 and isinstance(result[0], dict):
+        result = result[0]['embedding']
+    return np.asarray(result, dtype=np.float32)
+
+
+class DeepFaceGallery:
+    '''
+    Reference faces embedded once, a probe is identified with one embedding and one matrix product
+
+    DeepFace.verify(probe, reference) detects and embeds both images on every
+    call, so checking a frame against N references cost 2N forward passes.
+    Here the folder is embedded once at startup with DeepFace.represent and
+    kept as an (N, d) matrix; identify() embeds the probe once and computes
+    its distance to every reference in one vectorised step. The threshold is
+    the one DeepFace.verify uses for the same model and metric.
+
+    Raises ValueError when no image in the folder gives an embedding.
+
+    args:
+    folder_path: str, one image per person, the file name without extension is the name
+    model_name: str, DeepFace model, e.g. "VGG-Face", "Facenet", "ArcFace"
+    detector_backend: str, detector used on the reference images
+    distance_metric: "cosine", "euclidean" or "euclidean_l2"
+    threshold: float, defaults to DeepFace's threshold for model and metric
+    '''
+
+    def __init__(self, folder_path, model_name="VGG-Face", detector_backend="opencv", distance_metric="cosine",
+                 threshold=None):
+        if distance_metric not in ("cosine", "euclidean", "euclidean_l2"):
+            raise ValueError(f"Unknown distance metric: {distance_metric}")
+        self.model_name = model_name
+        self.distance_metric = distance_metric
+        self.threshold = threshold if threshold is not None else find_threshold(model_name, distance_metric)
+        self.names = []
+        rows = []
+        start = time.perf_counter()
+        for filename in sorted(os.listdir(folder_path)):
+            img = cv2.imread(os.path.join(folder_path, filename))
+            if img is None:
+                continue
+            try:
+                rows.append(representFace(img, model_name, detector_backend))
+            except ValueError as e:
+                print(f"Warning: no face in reference image {filename}: {e}")
+                continue
+            self.names.append(os.path.splitext(filename)[0])
+        self.embed_seconds = time.perf_counter() - start
+        if not rows:
+            raise ValueError(f"No usable reference face in {folder_path}")
+        self.matrix = np.array(rows, dtype=np.float32)
+        if distance_metric != "euclidean":
+            # Unit rows: cosine distance is 1 - dot product, euclidean_l2 compares unit vectors
+            self.matrix /= np.maximum(np.linalg.norm(self.matrix, axis=1, keepdims=True), 1e-12)
+
+    def __len__(self):
+        return len(self.names)
+
+    def distances(self, embedding):
+        '''
+        Distance of one probe embedding to every reference, in self.names order
+        '''
+        probe = np.asarray(embedding, dtype=np.float32)
+        if self.distance_metric != "euclidean":
+            probe = probe / max(np.linalg.norm(probe), 1e-12)
+        if self.distance_metric == "cosine":
+            return 1.0 - self.matrix @ probe
+        return np.linalg.norm(self.matrix - probe, axis=1)
+
+    def identify(self, img, detector_backend="opencv", enforce_detection=True):
+        '''
+        Closest reference to the face in img
+
+        args:
+        img: BGR image, a whole frame or an already cropped face (detector_backend="skip")
+        detector_backend: str
+
+        returns:
+        (name, distance): name is None when the closest reference is above the threshold
+        '''
+        dist = self.distances(representFace(img, self.model_name, detector_backend, enforce_detection))
+        best = int(np.argmin(dist))
+        if dist[best] <= self.threshold:
+            return self.names[best], float(dist[best])
+        return None, float(dist[best])
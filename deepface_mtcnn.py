@@ -1,43 +1,54 @@
 #pip install mtcnn, opencv-python, deepface
-import threading
-import os
 import cv2
-from deepface import DeepFace
-from mtcnn.mtcnn import MTCNN
+import numpy as np
 import time
 
+import config
+from deepface_gallery import DeepFaceGallery
+from frame_source import CameraSource
+from mtcnn_detector import MTCNNDetector
+from verification_worker import LatestFrameWorker
+
 folder_path = "/home/vk/Desktop/CVpractise/face_recognition/data"  # Replace with the path to your image folder
-reference_images = {os.path.splitext(img)[0]: cv2.imread(os.path.join(folder_path, img)) for img in os.listdir(folder_path)}
+# Reference faces are embedded once, each check is one embedding plus a matrix search
+gallery = DeepFaceGallery(folder_path)
+print(f"Embedded {len(gallery)} reference faces in {gallery.embed_seconds:.1f}s")
 
-cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+# Backend is config.CAMERA_BACKEND (set cv2.CAP_DSHOW there on Windows)
+cap = CameraSource(config.CAMERA_INDEX, width=640, height=480)
 
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+# Loaded and warmed up once, shared by the display loop and check_face
+detector = MTCNNDetector()
+print(f"MTCNN loaded in {detector.load_seconds:.2f}s, warm-up {detector.warmup_seconds:.2f}s")
 
 counter = 0
 start_time = time.time()
-
-face_match = False
+# Capture-to-label time of every check result that made it onto the screen
+labelSeq = -1
+labelLatencies = []
 
 
 def check_face(frame):
-    global face_match
+    '''
+    (name, distance) for the first face MTCNN finds, (None, None) without a face
+    '''
     try:
-        detector = MTCNN()
-        results = detector.detect_faces(frame)
+        results = detector.detect(frame)
 
         for result in results:
             x, y, w, h = result['box']
+            # MTCNN boxes can start slightly outside the frame
+            x, y = max(x, 0), max(y, 0)
             face_img = frame[y:y+h, x:x+w]
-            for name, reference_img in reference_images.items():
-                if DeepFace.verify(face_img, reference_img.copy())['verified']:
-                    face_match = True
-                    return name
-            face_match = False
-            return None
+            # Already cropped by MTCNN, DeepFace does not need to detect again
+            return gallery.identify(face_img, detector_backend="skip")
     except ValueError:
-        face_match = False
-        return None
+        pass
+    return None, None
+
+
+# One verification thread; a frame still waiting when the next one comes is dropped
+worker = LatestFrameWorker(check_face)
 
 
 while True:
@@ -45,14 +56,14 @@ while True:
 
     if ret:
         if counter % 30 == 0:
-            try:
-                name = threading.Thread(target=check_face, args=(frame.copy(),)).start()
-            except ValueError:
-                pass
+            worker.submit(counter, frame.copy(), cap.timestamp)
+        # Result of the newest frame that finished checking, read without waiting for the worker
+        check = worker.result()
+        name, distance = check.value if check.value is not None else (None, None)
+        face_match = name is not None
 
-        # Face detection using MTCNN
-        detector = MTCNN()
-        results = detector.detect_faces(frame)
+        # Face detection using the shared MTCNN
+        results = detector.detect(frame)
 
         for result in results:
             x, y, w, h = result['box']
@@ -63,7 +74,8 @@ while True:
 
             # Label name for detected face
             if face_match:
-                cv2.putText(frame, f"Match: {name}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+                cv2.putText(frame, f"Match: {name} ({distance:.2f})", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9,
+                            (0, 255, 0), 2)
             else:
                 cv2.putText(frame, "No Match", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
 
@@ -72,8 +84,16 @@ while True:
         # Calculate and display FPS
         fps = 1 / (time.time() - start_time)
         cv2.putText(frame, f"FPS: {fps:.2f}", (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        if check.seq >= 0:
+            age = time.time() - check.timestamp
+            cv2.putText(frame, f"Label from frame {check.seq}, {age * 1000:.0f} ms old", (20, 90),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
 
         cv2.imshow('video', frame)
+        if check.seq > labelSeq:
+            # First time this result is on screen
+            labelSeq = check.seq
+            labelLatencies.append(time.time() - check.timestamp)
 
         # Update start time for the next FPS calculation
         start_time = time.time()
@@ -82,4 +102,15 @@ while True:
     if key == ord('q'):
         break
 
+worker.close()
+stats = worker.stats()
+print(f"Checks: {stats['checked']} of {stats['submitted']} submitted frames, {stats['dropped']} superseded, "
+      f"capture to result p50 {stats['p50_ms']:.0f} ms / p95 {stats['p95_ms']:.0f} ms")
+if labelLatencies:
+    p50, p95 = np.percentile(labelLatencies, (50, 95)) * 1000
+    print(f"Capture to label on screen: p50 {p50:.0f} ms / p95 {p95:.0f} ms")
+stats = detector.stats()
+print(f"MTCNN: load {stats['load_ms']:.0f} ms, warm-up {stats['warmup_ms']:.0f} ms, "
+      f"{stats['calls']} calls at p50 {stats['p50_ms']:.1f} ms / p95 {stats['p95_ms']:.1f} ms")
+cap.release()
 cv2.destroyAllWindows()
@@ -17,6 +17,8 @@ def Remove_file(file_path:str=None):
 
     Remove_file_name:str = input("Please Enter your name:")
     removing_files = glob.glob(f'{file_path}/{Remove_file_name}.png')
+    # Enrollment encodings stored next to the image
+    removing_files += glob.glob(f'{file_path}/{Remove_file_name}.encodings.npz')
     for i in removing_files:
         os.remove(i)
         
@@ -0,0 +1,466 @@
+import time
+
+import cv2
+import face_recognition
+import numpy as np
+
+import config
+
+
+class IntervalDetector:
+    '''
+    Runs the HOG detector every few frames and moves the boxes by template matching in between
+
+    face_locations is the most expensive call per frame. Between two detector
+    runs every box is searched for in the next frame with cv2.matchTemplate in a
+    window around its last position. The interval adapts to the scene: it is
+    halved when faces move more than motion_threshold (shift as a fraction of
+    the box size) or a box is lost, and grows by one frame after each detection
+    cycle in which faces stayed still, between min_interval and max_interval.
+
+    Has to see the frames in order, so it must run in a single worker.
+
+    args:
+    interval: int, starting number of frames between detector runs
+    min_interval: int
+    max_interval: int
+    motion_threshold: float
+    min_score: float, lowest normalised correlation that still counts as found
+    detect_fn: callable rgb -> list of boxes, defaults to face_recognition.face_locations
+    '''
+
+    def __init__(self, interval=5, min_interval=1, max_interval=15, motion_threshold=0.15,
+                 min_score=0.6, detect_fn=None):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.motion_threshold = motion_threshold
+        self.min_score = min_score
+        self.detect_fn = detect_fn if detect_fn is not None else face_recognition.face_locations
+        self.frames = 0
+        self.detector_runs = 0
+        self.detect_time = 0.0
+        self.propagate_time = 0.0
+        self._since_detect = 0
+        # No box moved or got lost since the last detector run
+        self._still = False
+        self._prev_gray = None
+        self._boxes = []
+
+    def __call__(self, rgb):
+        '''
+        Face boxes for this frame
+
+        args:
+        rgb: RGB image
+
+        returns:
+        (boxes, detected), detected is True if the HOG detector ran on this frame
+        '''
+        self.frames += 1
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+
+        # A new detection scale makes the old boxes and templates useless
+        rescaled = self._prev_gray is not None and self._prev_gray.shape != gray.shape
+        if self._prev_gray is None or rescaled or self._since_detect >= self.interval:
+            # A full still cycle lets the next one be a frame longer
+            if self._still and not rescaled:
+                self.interval = min(self.max_interval, self.interval + 1)
+            self._still = True
+            start = time.perf_counter()
+            boxes = self.detect_fn(rgb)
+            self.detect_time += time.perf_counter() - start
+            self.detector_runs += 1
+            self._since_detect = 0
+            detected = True
+        else:
+            start = time.perf_counter()
+            boxes, lost, motion = self._propagate(gray)
+            self.propagate_time += time.perf_counter() - start
+            detected = False
+            if lost or motion > self.motion_threshold:
+                self.interval = max(self.min_interval, self.interval // 2)
+                self._still = False
+                # Make sure the detector runs on the next frame
+                self._since_detect = self.interval
+
+        self._since_detect += 1
+        self._prev_gray = gray
+        self._boxes = boxes
+        return boxes, detected
+
+    def reset(self):
+        '''
+        Forget the boxes, the next frame runs the detector
+        '''
+        self._prev_gray = None
+        self._boxes = []
+        self._still = False
+
+    def _propagate(self, gray):
+        boxes = []
+        lost = False
+        motion = 0.0
+        height, width = gray.shape[:2]
+        for top, right, bottom, left in self._boxes:
+            top, left = max(top, 0), max(left, 0)
+            bottom, right = min(bottom, height), min(right, width)
+            box_h, box_w = bottom - top, right - left
+            if box_h < 4 or box_w < 4:
+                lost = True
+                continue
+            template = self._prev_gray[top:bottom, left:right]
+
+            # Search window of half a box in every direction
+            margin_y, margin_x = box_h // 2, box_w // 2
+            wy, wx = max(0, top - margin_y), max(0, left - margin_x)
+            window = gray[wy:min(height, bottom + margin_y), wx:min(width, right + margin_x)]
+            if window.shape[0] < box_h or window.shape[1] < box_w:
+                lost = True
+                continue
+
+            result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (dx, dy) = cv2.minMaxLoc(result)
+            if score < self.min_score:
+                lost = True
+                continue
+            new_top, new_left = wy + dy, wx + dx
+            motion = max(motion, max(abs(new_top - top) / box_h, abs(new_left - left) / box_w))
+            boxes.append((new_top, new_left + box_w, new_top + box_h, new_left))
+        return boxes, lost, motion
+
+    def stats(self):
+        '''
+        Detector runs and the estimated speed-up of the detect step
+
+        speedup compares the time spent against running HOG on every frame,
+        using the measured mean cost of one HOG run.
+        '''
+        hog_ms = self.detect_time / self.detector_runs * 1000 if self.detector_runs else 0.0
+        spent = self.detect_time + self.propagate_time
+        speedup = (hog_ms / 1000 * self.frames) / spent if spent > 0 else 1.0
+        return {
+            'frames': self.frames,
+            'detector_runs': self.detector_runs,
+            'interval': self.interval,
+            'hog_ms': hog_ms,
+            'propagate_ms': self.propagate_time / max(self.frames - self.detector_runs, 1) * 1000,
+            'speedup': speedup,
+        }
+
+
+class AdaptiveScaler:
+    '''
+    Picks the detection scale of one camera from the faces it saw last
+
+    HOG needs a face of about 40 pixels in the image it searches (with
+    face_locations' single upsample) and its cost grows with the pixel
+    count. The scale is chosen so that the smallest face of the previous
+    frame comes out about target_px tall: distant faces get a larger image,
+    close ones a smaller one. Without faces the scale at which a face of
+    min_face_px (in the full frame) reaches target_px is used, so people
+    further away than that are not looked for.
+
+    Scales come from a fixed list so only a few frame sizes occur. Going up
+    happens at once, going down only after `patience` frames in a row asked
+    for it. DETECT_SCALES = (0.25,) gives the old fixed quarter size.
+
+    args:
+    scales: iterable of allowed scales
+    target_px: int, wanted height of the smallest face in the detection image
+    min_face_px: int, smallest full-frame face looked for when no face is known
+    patience: int
+    '''
+
+    def __init__(self, scales=(0.25, 0.5, 1.0), target_px=60, min_face_px=120, patience=10):
+        self.scales = sorted(scales)
+        self.target_px = target_px
+        self.patience = patience
+        self.search_scale = self._pick(target_px / min_face_px)
+        self.scale = self.search_scale
+        self._lower = 0
+
+    def _pick(self, wanted):
+        # Smallest allowed scale that is at least the wanted one
+        for scale in self.scales:
+            if scale >= wanted:
+                return scale
+        return self.scales[-1]
+
+    def update(self, faces, scale):
+        '''
+        Feed back the boxes found in a frame detected at `scale`
+
+        args:
+        faces: list of (top, right, bottom, left) in the detection image
+        scale: float, the scale that image was made with
+        '''
+        if faces:
+            smallest = min(bottom - top for top, _, bottom, _ in faces) / scale
+            wanted = self._pick(self.target_px / max(smallest, 1))
+        else:
+            wanted = self.search_scale
+        if wanted > self.scale:
+            self.scale = wanted
+            self._lower = 0
+        elif wanted < self.scale:
+            self._lower += 1
+            if self._lower >= self.patience:
+                self.scale = wanted
+                self._lower = 0
+        else:
+            self._lower = 0
+
+
+class RoiDetector:
+    '''
+    Runs the detector only in windows around the last known faces
+
+    Each box is grown by `margin` of its size on every side, overlapping
+    windows are merged and HOG searches only those crops. The whole frame is
+    searched every full_interval calls, when nothing is known yet and on the
+    call after a face went missing, so new people are still picked up.
+    Boxes are remembered relative to the image size, so a change of the
+    detection scale between calls does not matter.
+
+    Usable on its own or as the detect_fn of an IntervalDetector.
+
+    args:
+    margin: float
+    full_interval: int
+    detect_fn: callable rgb -> list of boxes, defaults to face_recognition.face_locations
+    '''
+
+    def __init__(self, margin=0.5, full_interval=10, detect_fn=None):
+        self.margin = margin
+        self.full_interval = full_interval
+        self.detect_fn = detect_fn if detect_fn is not None else face_recognition.face_locations
+        self.frames = 0
+        self.full_runs = 0
+        self.scanned = 0.0
+        self._regions = []
+        self._since_full = 0
+
+    def __call__(self, rgb):
+        height, width = rgb.shape[:2]
+        self.frames += 1
+        if not self._regions or self._since_full >= self.full_interval:
+            boxes = self.detect_fn(rgb)
+            self.full_runs += 1
+            self.scanned += 1.0
+            self._since_full = 0
+        else:
+            boxes = []
+            area = 0
+            for top, right, bottom, left in self._windows(height, width):
+                crop = np.ascontiguousarray(rgb[top:bottom, left:right])
+                for t, r, b, l in self.detect_fn(crop):
+                    boxes.append((t + top, r + left, b + top, l + left))
+                area += (bottom - top) * (right - left)
+            self.scanned += area / (height * width)
+            if len(boxes) < len(self._regions):
+                # Someone left their window (or the frame), look everywhere next time
+                self._since_full = self.full_interval
+        self._since_full += 1
+        self._regions = [(t / height, r / width, b / height, l / width) for t, r, b, l in boxes]
+        return boxes
+
+    def _windows(self, height, width):
+        windows = []
+        for t, r, b, l in self._regions:
+            t, r, b, l = t * height, r * width, b * height, l * width
+            dy, dx = (b - t) * self.margin, (r - l) * self.margin
+            windows.append([max(0, int(t - dy)), min(width, int(r + dx)),
+                            min(height, int(b + dy)), max(0, int(l - dx))])
+        # Merge overlapping windows so no face is found twice
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(windows)):
+                for j in range(i + 1, len(windows)):
+                    a, c = windows[i], windows[j]
+                    if a[0] < c[2] and c[0] < a[2] and a[3] < c[1] and c[3] < a[1]:
+                        windows[i] = [min(a[0], c[0]), max(a[1], c[1]), max(a[2], c[2]), min(a[3], c[3])]
+                        del windows[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return windows
+
+    def stats(self):
+        '''
+        Full-frame runs and the average fraction of the frame HOG searched
+        '''
+        return {
+            'frames': self.frames,
+            'full_runs': self.full_runs,
+            'scanned': self.scanned / self.frames if self.frames else 1.0,
+        }
+
+
+class DetectionZone:
+    '''
+    Part of a camera's view where faces count, e.g. the doorway
+
+    The polygon is given in fractions of the frame width and height, so it
+    does not depend on the camera resolution. Frames are cropped to the
+    polygon's bounding rectangle before detection, so HOG only pays for
+    that area, and faces whose centre lies outside the polygon are dropped.
+
+    args:
+    polygon: list of (x, y) with 0 <= x, y <= 1
+    '''
+
+    def __init__(self, polygon):
+        self.polygon = np.array(polygon, dtype=np.float32).reshape(-1, 2)
+        if len(self.polygon) < 3:
+            raise ValueError("A detection zone needs at least 3 points")
+        self._size = None
+
+    def _fit(self, width, height):
+        # Pixel polygon and bounding rectangle, recomputed only when the frame size changes
+        if self._size != (width, height):
+            self._size = (width, height)
+            self.points = np.round(self.polygon * [width, height]).astype(np.int32)
+            x, y, w, h = cv2.boundingRect(self.points)
+            self.rect = (max(x, 0), max(y, 0), min(x + w, width), min(y + h, height))
+
+    def crop(self, frame):
+        '''
+        Bounding rectangle of the zone cut out of the frame
+
+        returns:
+        (crop, (x, y)): the view into frame and the offset of its top left corner
+        '''
+        self._fit(frame.shape[1], frame.shape[0])
+        x0, y0, x1, y1 = self.rect
+        return frame[y0:y1, x0:x1], (x0, y0)
+
+    def contains(self, box):
+        '''
+        True if the centre of a (top, right, bottom, left) frame box is inside the polygon
+        '''
+        top, right, bottom, left = box
+        centre = ((left + right) / 2, (top + bottom) / 2)
+        return cv2.pointPolygonTest(self.points.reshape(-1, 1, 2), centre, False) >= 0
+
+
+class MotionGate:
+    '''
+    Skips face detection while nothing moves in front of a camera
+
+    Every frame is shrunk to a `width` pixel wide grey thumbnail and compared
+    with a running-average background. The gate opens as soon as more than
+    min_area of the thumbnail changed by more than pixel_threshold, and only
+    closes after hold_frames frames in a row with less than half that much
+    motion, so a person standing still for a moment is not lost. It stays
+    open while the last detection found faces, and a closed gate still lets
+    one frame through every force_seconds in case the background model
+    missed someone.
+
+    Has to see the frames in order, so it must run in a single worker.
+
+    args:
+    pixel_threshold: int, grey-level change that counts as motion
+    min_area: float, fraction of the thumbnail that has to change
+    hold_frames: int
+    force_seconds: float, 0 disables the forced checks
+    width: int, thumbnail width
+    learning_rate: float, how fast the background follows slow changes (light)
+    '''
+
+    def __init__(self, pixel_threshold=25, min_area=0.002, hold_frames=15, force_seconds=5.0, width=80,
+                 learning_rate=0.05):
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.hold_frames = hold_frames
+        self.force_seconds = force_seconds
+        self.width = width
+        self.learning_rate = learning_rate
+        self.open = True
+        self.frames = 0
+        self.passed = 0
+        self.gate_time = 0.0
+        self._background = None
+        self._quiet = 0
+        self._last_pass = None
+
+    def __call__(self, rgb, timestamp, faces_known=False):
+        '''
+        True if the detector should run on this frame
+
+        args:
+        rgb: RGB image
+        timestamp: float, frame time in seconds
+        faces_known: bool, the previous frame had faces
+        '''
+        start = time.perf_counter()
+        self.frames += 1
+        height = max(1, round(rgb.shape[0] * self.width / rgb.shape[1]))
+        thumb = cv2.resize(cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY), (self.width, height),
+                           interpolation=cv2.INTER_AREA)
+        thumb = cv2.GaussianBlur(thumb, (5, 5), 0)
+
+        if self._background is None or self._background.shape != thumb.shape:
+            self._background = thumb.astype(np.float32)
+            moving = 1.0
+        else:
+            diff = cv2.absdiff(thumb, cv2.convertScaleAbs(self._background))
+            moving = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+            cv2.accumulateWeighted(thumb, self._background, self.learning_rate)
+
+        if moving >= self.min_area:
+            self.open = True
+            self._quiet = 0
+        elif moving < self.min_area / 2:
+            self._quiet += 1
+            if self._quiet >= self.hold_frames and not faces_known:
+                self.open = False
+        else:
+            self._quiet = 0
+
+        forced = (not self.open and self.force_seconds and
+                  (self._last_pass is None or timestamp - self._last_pass >= self.force_seconds))
+        self.gate_time += time.perf_counter() - start
+        if self.open or forced:
+            self._last_pass = timestamp
+            self.passed += 1
+            return True
+        return False
+
+    def stats(self):
+        '''
+        Frames let through to the detector and the cost of the gate itself
+        '''
+        return {
+            'frames': self.frames,
+            'passed': self.passed,
+            'skipped': 1 - self.passed / self.frames if self.frames else 0.0,
+            'gate_ms': self.gate_time / self.frames * 1000 if self.frames else 0.0,
+        }
+
+
+def buildDetector(interval=None, roi=None):
+    '''
+    Detector for one camera as configured in config.py
+
+    args:
+    interval: int, frames between detector runs, defaults to config.DETECT_INTERVAL
+    roi: bool, search only around the last faces, defaults to config.DETECT_ROI
+
+    returns:
+    IntervalDetector, or None when plain full-frame HOG on every frame is wanted
+    '''
+    if interval is None:
+        interval = config.DETECT_INTERVAL
+    if roi is None:
+        roi = config.DETECT_ROI
+    detect_fn = RoiDetector(config.DETECT_ROI_MARGIN, config.DETECT_FULL_FRAME_INTERVAL) if roi else None
+    if interval <= 1 and detect_fn is None:
+        return None
+    interval = max(interval, 1)
+    # With an interval of 1 the detector runs on every frame and only the ROI search is used
+    return IntervalDetector(interval, min(config.DETECT_INTERVAL_MIN, interval),
+                            config.DETECT_INTERVAL_MAX if interval > 1 else 1,
+                            config.DETECT_MOTION_THRESHOLD, config.PROPAGATE_MIN_SCORE, detect_fn)
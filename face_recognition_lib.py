@@ -3,6 +3,11 @@ import mediapipe as mp
 import face_recognition
 import os
 
+import config
+from frame_source import CameraSource
+from gallery import encodeGalleryImage
+from gallery_index import GalleryIndex
+
 mp_face_detection = mp.solutions.face_detection
 mp_drawing = mp.solutions.drawing_utils
 
@@ -18,17 +23,23 @@ images_folder = 'images'
 for filename in os.listdir(images_folder):
     if filename.endswith(".jpg") or filename.endswith(".png"):
         img_path = os.path.join(images_folder, filename)
-        image = face_recognition.load_image_file(img_path)
-        face_encoding = face_recognition.face_encodings(image)[0]
+        # Same downscaled RGB recipe as the frames below
+        face_encoding = encodeGalleryImage(cv2.imread(img_path))
 
         # Extract name from filename (assuming filename is in the format "Name.jpg")
         name = os.path.splitext(filename)[0]
+        if face_encoding is None:
+            print(f"Warning: No face detected in image for {name}")
+            continue
 
         known_faces.append(face_encoding)
         known_names.append(name)
 
+# All known faces in one matrix, every face of a frame is matched in one call
+knownIndex = GalleryIndex(known_names, known_faces)
+
 # Open the webcam
-cap = cv2.VideoCapture(0)  # Use 0 for default webcam
+cap = CameraSource(config.CAMERA_INDEX)  # Camera index and backend come from config.py
 
 while cap.isOpened():
     ret, frame = cap.read()
@@ -43,29 +54,35 @@ while cap.isOpened():
 
     # Check if faces are detected
     if results.detections:
+        # dlib encodes on the quarter-size RGB frame, like main.py
+        small = cv2.resize(rgb_frame, (0, 0), fx=0.25, fy=0.25)
+        sh, sw = small.shape[:2]
+        ih, iw, _ = frame.shape
+        faces = []
         for detection in results.detections:
             bboxC = detection.location_data.relative_bounding_box
-            ih, iw, _ = frame.shape
-            bbox = int(bboxC.xmin * iw), int(bboxC.ymin * ih), \
-                   int(bboxC.width * iw), int(bboxC.height * ih)
-
-            # Extract face encoding
-            face_encoding = face_recognition.face_encodings(frame, [bbox])[0]
-
-            # Check if the face matches any known faces
-            matches = face_recognition.compare_faces(known_faces, face_encoding)
-
-            name = "Unknown"
-
-            # If a match is found, use the name of the first matching known face
-            if True in matches:
-                first_match_index = matches.index(True)
-                name = known_names[first_match_index]
+            # MediaPipe gives a relative (xmin, ymin, width, height), face_encodings wants (top, right, bottom, left)
+            top = max(0, int(bboxC.ymin * sh))
+            left = max(0, int(bboxC.xmin * sw))
+            bottom = min(sh, int((bboxC.ymin + bboxC.height) * sh))
+            right = min(sw, int((bboxC.xmin + bboxC.width) * sw))
+            if bottom > top and right > left:
+                faces.append((detection, (top, right, bottom, left)))
+
+        # Extract the encodings of all faces in one call
+        face_encodings = face_recognition.face_encodings(small, [box for _, box in faces]) if faces else []
+        names, distances = knownIndex.lookup(face_encodings) if face_encodings else ([], [])
+
+        for (detection, _), name, distance in zip(faces, names, distances):
+            # Same tolerance as face_recognition.compare_faces, the closest known face wins
+            if name is None or distance > 0.6:
+                name = "Unknown"
 
             # Draw bounding box and name on the frame
             mp_drawing.draw_detection(frame, detection)
+            bboxC = detection.location_data.relative_bounding_box
             font = cv2.FONT_HERSHEY_DUPLEX
-            cv2.putText(frame, name, (bbox[0], bbox[1] - 10), font, 0.5, (255, 255, 255), 1)
+            cv2.putText(frame, name, (int(bboxC.xmin * iw), int(bboxC.ymin * ih) - 10), font, 0.5, (255, 255, 255), 1)
 
     # Display the frame with detected faces and names
     cv2.imshow('Face Recognition', frame)
@@ -0,0 +1,210 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+import config
+
+
+class FrameSource:
+    '''
+    Common interface for everything the scripts read frames from
+
+    Behaves like cv2.VideoCapture (read, isOpened, release), so it can be
+    handed to ThreadedCapture or SequentialCapture. Frames are resized to
+    width x height when both are given, and read() is paced to at most `fps`
+    frames per second when fps is given. After every read, `timestamp` holds
+    the time of the frame in seconds on the source's own clock (wall clock for
+    cameras, position in the file for recordings).
+
+    args:
+    width: int or None
+    height: int or None
+    fps: float or None
+    '''
+
+    def __init__(self, width=None, height=None, fps=None):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.timestamp = None
+        self.frames = 0
+        self._next_time = None
+
+    def _grab(self):
+        '''
+        Read the next raw frame, implemented by the subclasses
+
+        returns:
+        (success, frame, timestamp)
+        '''
+        raise NotImplementedError
+
+    def read(self):
+        if self.fps:
+            now = time.perf_counter()
+            if self._next_time is not None and now < self._next_time:
+                time.sleep(self._next_time - now)
+            self._next_time = max(now, self._next_time or now) + 1.0 / self.fps
+        success, frame, timestamp = self._grab()
+        if not success or frame is None:
+            return False, None
+        if self.width and self.height and (frame.shape[1], frame.shape[0]) != (self.width, self.height):
+            frame = cv2.resize(frame, (self.width, self.height))
+        self.timestamp = timestamp
+        self.frames += 1
+        return True, frame
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+class CameraSource(FrameSource):
+    '''
+    Local camera by index (or any URL cv2.VideoCapture accepts, e.g. RTSP)
+
+    args:
+    index: int or str, defaults to config.CAMERA_INDEX
+    backend: cv2.CAP_* constant, defaults to config.CAMERA_BACKEND
+    '''
+
+    def __init__(self, index=None, width=None, height=None, fps=None, backend=None):
+        super().__init__(width, height, fps)
+        if index is None:
+            index = config.CAMERA_INDEX
+        if backend is None:
+            backend = config.CAMERA_BACKEND
+        self.cap = cv2.VideoCapture(index, backend)
+        # Ask the driver for the target format first, read() resizes if it refuses
+        if width and height:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+
+    def _grab(self):
+        success, frame = self.cap.read()
+        return success, frame, time.time()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    '''
+    Recorded video file, timestamps are the position in the file
+
+    args:
+    path: str
+    fps: float or None, None replays as fast as frames are consumed
+    '''
+
+    def __init__(self, path, width=None, height=None, fps=None):
+        super().__init__(width, height, fps)
+        self.cap = cv2.VideoCapture(path)
+
+    def _grab(self):
+        success, frame = self.cap.read()
+        return success, frame, self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageFolderSource(FrameSource):
+    '''
+    Sorted image files of a folder, one frame per file
+
+    Timestamps assume the frames were taken at `fps` (25 if not given).
+
+    args:
+    folder: str
+    extensions: tuple of accepted file extensions
+    '''
+
+    def __init__(self, folder, width=None, height=None, fps=None, extensions=(".png", ".jpg", ".jpeg", ".bmp")):
+        super().__init__(width, height, fps)
+        self.files = [os.path.join(folder, f) for f in sorted(os.listdir(folder))
+                      if f.lower().endswith(extensions)]
+        self.index = 0
+
+    def _grab(self):
+        if self.index >= len(self.files):
+            return False, None, None
+        frame = cv2.imread(self.files[self.index])
+        timestamp = self.index / (self.fps or 25.0)
+        self.index += 1
+        return frame is not None, frame, timestamp
+
+    def isOpened(self):
+        return self.index < len(self.files)
+
+    def release(self):
+        self.index = len(self.files)
+
+
+class SyntheticSource(FrameSource):
+    '''
+    Generated frames for throughput tests without any camera
+
+    Draws `faces` images sliding across a noisy background. Pass gallery
+    images to get frames the detector actually finds faces in; without them
+    textured squares are drawn instead.
+
+    args:
+    count: int or None, number of frames before the source ends (None = endless)
+    faces: list of BGR images to paste into the frames
+    seed: int
+    '''
+
+    def __init__(self, width=640, height=480, fps=None, count=None, faces=None, seed=0):
+        super().__init__(width, height, fps)
+        self.count = count
+        self.rng = np.random.default_rng(seed)
+        size = height // 3
+        if faces:
+            self.faces = [cv2.resize(f, (size, size)) for f in faces]
+        else:
+            self.faces = [(self.rng.random((size, size, 3)) * 255).astype(np.uint8)]
+        self.background = (self.rng.random((height, width, 3)) * 60 + 80).astype(np.uint8)
+
+    def _grab(self):
+        if self.count is not None and self.frames >= self.count:
+            return False, None, None
+        frame = self.background.copy()
+        size = self.faces[0].shape[0]
+        travel = max(self.width - size, 1)
+        for i, face in enumerate(self.faces):
+            x = (self.frames * 4 + i * travel // len(self.faces)) % travel
+            y = (self.height - size) // 2
+            frame[y:y + size, x:x + size] = face
+        return True, frame, self.frames / (self.fps or 25.0)
+
+
+def openSource(spec, width=None, height=None, fps=None):
+    '''
+    FrameSource from a command-line style description
+
+    args:
+    spec: camera index ("0"), "synthetic", a folder of images, or a video file / stream URL
+    '''
+    if isinstance(spec, int) or str(spec).isdigit():
+        return CameraSource(int(spec), width, height, fps)
+    if spec == "synthetic":
+        return SyntheticSource(width or 640, height or 480, fps)
+    if os.path.isdir(spec):
+        return ImageFolderSource(spec, width, height, fps)
+    if os.path.isfile(spec):
+        return VideoFileSource(spec, width, height, fps)
+    # Anything else (rtsp://, http://) goes straight to OpenCV
+    return CameraSource(spec, width, height, fps)
@@ -0,0 +1,464 @@
+import cv2
+import numpy as np
+import face_recognition
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import config
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no advisory file locks, cache writers are not serialised there
+    fcntl = None
+
+# Bump this whenever the encoding recipe (scale, model, layout) changes,
+# so that old cache files are thrown away instead of silently reused.
+CACHE_VERSION = 3
+
+
+def encodeGalleryImage(img):
+    '''
+    Encode the first face of a gallery image
+
+    Tries the quarter size first, like the camera loop did before the
+    adaptive scale, then the larger config.DETECT_SCALES until a face is
+    found, so a photo with a small face is not rejected.
+
+    args:
+    img: BGR image as returned by cv2.imread
+
+    returns:
+    128-d encoding, or None if no face was found
+    '''
+    if img is None:
+        return None
+    for scale in sorted({0.25, *(s for s in config.DETECT_SCALES if s > 0.25)}):
+        small_frame = cv2.resize(img, (0,0), fx=scale, fy=scale)
+        rgb = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        encodings = face_recognition.face_encodings(rgb)
+        if len(encodings) > 0:
+            return encodings[0]
+    return None
+
+
+def encodeGalleryFile(file_path):
+    '''
+    Decode, detect and encode one gallery file, runs inside the enrollment worker processes
+
+    returns:
+    (encoding, error): encoding is None and error says why when it failed
+    '''
+    try:
+        img = cv2.imread(file_path)
+        if img is None:
+            return None, "could not read image"
+        encoding = encodeGalleryImage(img)
+        if encoding is None:
+            return None, "no face detected"
+        return encoding, None
+    except Exception as e:
+        return None, str(e)
+
+
+def encodeGalleryFiles(file_paths, workers=None):
+    '''
+    Encode gallery files in parallel on a process pool
+
+    dlib runs one image per core, so cold-start enrollment scales with the
+    number of cores. workers=1 (or a single file) encodes in this process.
+    The pool is only used when processes start by fork (Linux before Python
+    3.14): with spawn or forkserver each worker re-imports the main script,
+    and main.py runs at import time. Forking a threaded process can deadlock
+    the children, so only use it before the process starts its own threads
+    (capture, pipeline, writer).
+
+    args:
+    file_paths: list of str
+    workers: int, defaults to config.ENROLL_WORKERS or the number of cores
+
+    returns:
+    list of (encoding, error) in the order of file_paths
+    '''
+    if workers is None:
+        workers = config.ENROLL_WORKERS or os.cpu_count() or 1
+    workers = min(workers, len(file_paths))
+    if workers <= 1 or multiprocessing.get_start_method() != 'fork':
+        return [encodeGalleryFile(p) for p in file_paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(encodeGalleryFile, file_paths, chunksize=max(1, len(file_paths) // (workers * 4))))
+
+
+def listGalleryFiles(path=None):
+    '''
+    Sorted list of image file names in the gallery folder
+
+    args:
+    path: str, gallery folder
+    '''
+    if path is None:
+        path = config.GALLERY_PATH
+    return sorted(f for f in os.listdir(path)
+                  if f.lower().endswith(config.GALLERY_EXTENSIONS))
+
+
+def fileHash(file_path):
+    '''
+    sha1 of the file contents, used to detect real changes when the mtime moved
+    '''
+    h = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def loadCache(cache_file=None):
+    '''
+    Read the encoding cache into a dict keyed by file name
+
+    Each value is a dict with mtime, size, hash and encodings, a (K,128)
+    array: one row for a plain gallery image, several for an image stored by
+    the enrollment tool, none if the image had no detectable face. A
+    missing, unreadable or outdated cache returns an empty dict.
+
+    args:
+    cache_file: str
+    '''
+    if cache_file is None:
+        cache_file = config.ENCODING_CACHE_FILE
+    if not os.path.exists(cache_file):
+        return {}
+    try:
+        with np.load(cache_file, allow_pickle=False) as data:
+            if int(data['version']) != CACHE_VERSION:
+                print("Encoding cache version changed, rebuilding")
+                return {}
+            entries = {}
+            offsets = np.concatenate(([0], np.cumsum(data['counts'])))
+            encodings = data['encodings']
+            for i, filename in enumerate(data['files']):
+                entries[str(filename)] = {
+                    'mtime': float(data['mtimes'][i]),
+                    'size': int(data['sizes'][i]),
+                    'hash': str(data['hashes'][i]),
+                    'encodings': encodings[offsets[i]:offsets[i + 1]],
+                }
+            return entries
+    except Exception as e:
+        print(f"Warning: could not read encoding cache {cache_file}: {e}")
+        return {}
+
+
+def saveCache(entries, cache_file=None):
+    '''
+    Write the encoding cache atomically (temp file + rename)
+
+    The temp file has a unique name, so two processes saving at once
+    cannot clobber each other's half-written file. Callers that read,
+    modify and save should hold cacheLock.
+
+    args:
+    entries: dict as returned by loadCache
+    cache_file: str
+    '''
+    if cache_file is None:
+        cache_file = config.ENCODING_CACHE_FILE
+    cache_dir = os.path.dirname(cache_file)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    files = sorted(entries)
+    # All encodings in one matrix, counts says how many rows belong to each file
+    counts = np.array([len(entries[k]['encodings']) for k in files], dtype=np.int64)
+    encodings = np.concatenate([np.asarray(entries[k]['encodings'], dtype=np.float64).reshape(-1, 128)
+                                for k in files] or [np.zeros((0, 128))])
+
+    fd, tmp_file = tempfile.mkstemp(dir=cache_dir or '.', prefix=os.path.basename(cache_file) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f,
+                     version=np.array(CACHE_VERSION),
+                     files=np.array(files, dtype=str),
+                     mtimes=np.array([entries[k]['mtime'] for k in files], dtype=np.float64),
+                     sizes=np.array([entries[k]['size'] for k in files], dtype=np.int64),
+                     hashes=np.array([entries[k]['hash'] for k in files], dtype=str),
+                     counts=counts,
+                     encodings=encodings)
+        os.replace(tmp_file, cache_file)
+    except BaseException:
+        os.unlink(tmp_file)
+        raise
+
+
+@contextmanager
+def cacheLock(cache_file=None):
+    '''
+    Exclusive lock (cache_file + '.lock') around a load-modify-save of the cache
+
+    main.py and the enrollment tool both update the cache file; without the
+    lock one of them could save a stale copy over the other's changes.
+    '''
+    if cache_file is None:
+        cache_file = config.ENCODING_CACHE_FILE
+    if fcntl is None:
+        yield
+        return
+    cache_dir = os.path.dirname(cache_file)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    with open(cache_file + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def saveEntries(entries, cache_file=None):
+    '''
+    Save synced entries, keeping what another process stored in the meantime
+
+    The disk cache is re-read under cacheLock. Where it has an entry for the
+    same file content (same hash) that differs from ours, e.g. encodings the
+    enrollment tool stored while we were encoding, that entry wins.
+    Entries for files that are no longer in `entries` are dropped.
+
+    returns:
+    the entries that were saved
+    '''
+    with cacheLock(cache_file):
+        disk = loadCache(cache_file)
+        merged = {}
+        for filename, entry in entries.items():
+            other = disk.get(filename)
+            if other is not None and other['hash'] == entry['hash'] and \
+                    not np.array_equal(other['encodings'], entry['encodings']):
+                entry = dict(other, mtime=entry['mtime'], size=entry['size'])
+            merged[filename] = entry
+        saveCache(merged, cache_file)
+    return merged
+
+
+def storeEncoding(filename, encodings, path=None, cache_file=None):
+    '''
+    Put the encodings of a freshly saved gallery image straight into the cache
+
+    Used by the enrollment tool, which already has the face, so that
+    main.py (and its gallery watcher) never has to encode that image again.
+    The entry is keyed by the file's current mtime, size and hash like any
+    other cache entry.
+
+    args:
+    filename: str, file name inside the gallery folder
+    encodings: one 128-d encoding or a (K,128) array, e.g. one per captured pose
+    path: str, gallery folder
+    cache_file: str
+    '''
+    if path is None:
+        path = config.GALLERY_PATH
+    file_path = os.path.join(path, filename)
+    st = os.stat(file_path)
+    entry = {
+        'mtime': st.st_mtime,
+        'size': st.st_size,
+        'hash': fileHash(file_path),
+        'encodings': np.asarray(encodings, dtype=np.float64).reshape(-1, 128),
+    }
+    with cacheLock(cache_file):
+        entries = loadCache(cache_file)
+        entries[filename] = entry
+        saveCache(entries, cache_file)
+
+
+def enrollmentFile(filename, path=None):
+    '''
+    Path of the sidecar with the enrollment encodings of a gallery image, e.g. Attendance_data/NAME.encodings.npz
+    '''
+    if path is None:
+        path = config.GALLERY_PATH
+    return os.path.join(path, os.path.splitext(filename)[0] + '.encodings.npz')
+
+
+def loadEnrollment(filename, digest, path=None):
+    '''
+    Encodings the enrollment tool stored next to a gallery image
+
+    Unlike the cache, the sidecar is not tied to CACHE_VERSION and cannot be
+    regenerated from the image (it holds one encoding per captured pose).
+    It remembers the hash of the image it belongs to, so a replaced photo
+    does not keep the old person's encodings.
+
+    args:
+    filename: str, gallery image file name
+    digest: str, fileHash of the image as it is now
+
+    returns:
+    (K,128) array, or None without a matching sidecar
+    '''
+    sidecar = enrollmentFile(filename, path)
+    if not os.path.exists(sidecar):
+        return None
+    try:
+        with np.load(sidecar, allow_pickle=False) as data:
+            if str(data['image_hash']) != digest:
+                return None
+            return np.asarray(data['encodings'], dtype=np.float64).reshape(-1, 128)
+    except Exception as e:
+        print(f"Warning: could not read {sidecar}: {e}")
+        return None
+
+
+def saveEnrolledImage(filename, image, encodings, path=None, cache_file=None):
+    '''
+    Write a new gallery image together with its enrollment encodings
+
+    The sidecar (see loadEnrollment) is written first and the image last, so
+    a gallery watcher that sees the image always finds its encodings; the
+    cache is updated as well so nothing has to be encoded again.
+
+    args:
+    filename: str, e.g. "NAME.png"
+    image: BGR image
+    encodings: (K,128) array, one row per captured pose
+    path: str, gallery folder
+    cache_file: str
+    '''
+    if path is None:
+        path = config.GALLERY_PATH
+    success, data = cv2.imencode(os.path.splitext(filename)[1], image)
+    if not success:
+        raise ValueError(f"Could not encode {filename}")
+    data = data.tobytes()
+    encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, 128)
+
+    sidecar = enrollmentFile(filename, path)
+    tmp_file = sidecar + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        np.savez(f, image_hash=np.array(hashlib.sha1(data).hexdigest()), encodings=encodings)
+    os.replace(tmp_file, sidecar)
+    with open(os.path.join(path, filename), 'wb') as f:
+        f.write(data)
+    storeEncoding(filename, encodings, path, cache_file)
+
+
+def syncGalleryEntries(path, cached, workers=None):
+    '''
+    Bring cache entries up to date with the gallery folder
+
+    A file is reused from `cached` when its mtime and size are unchanged.
+    If either moved, the content hash decides whether it really changed.
+    Files that are gone from the folder are dropped. Encodings from an
+    enrollment sidecar (loadEnrollment) replace the cached or computed ones,
+    so they survive a cache rebuild.
+
+    args:
+    path: str, gallery folder
+    cached: dict as returned by loadCache
+    workers: int, enrollment processes, see encodeGalleryFiles
+
+    returns:
+    (entries, encoded, failed): the new entries dict, the names of the files that
+    were encoded and (file name, reason) for those of them that gave no encoding
+    '''
+    entries = {}
+    to_encode = []
+    for filename in listGalleryFiles(path):
+        file_path = os.path.join(path, filename)
+        st = os.stat(file_path)
+        entry = cached.get(filename)
+
+        if entry is not None and entry['mtime'] == st.st_mtime and entry['size'] == st.st_size:
+            enrolled = loadEnrollment(filename, entry['hash'], path)
+            if enrolled is not None and not np.array_equal(enrolled, entry['encodings']):
+                entry = dict(entry, encodings=enrolled)
+            entries[filename] = entry
+            continue
+
+        digest = fileHash(file_path)
+        enrolled = loadEnrollment(filename, digest, path)
+        if enrolled is not None:
+            entries[filename] = {'mtime': st.st_mtime, 'size': st.st_size, 'hash': digest, 'encodings': enrolled}
+        elif entry is not None and entry['hash'] == digest:
+            # Touched but not modified, keep the encoding
+            entries[filename] = dict(entry, mtime=st.st_mtime, size=st.st_size)
+        else:
+            entries[filename] = {'mtime': st.st_mtime, 'size': st.st_size, 'hash': digest}
+            to_encode.append(filename)
+
+    # New and changed images are encoded together on the enrollment process pool
+    results = encodeGalleryFiles([os.path.join(path, f) for f in to_encode], workers) if to_encode else []
+    failed = []
+    for filename, (encoding, error) in zip(to_encode, results):
+        entries[filename]['encodings'] = np.asarray(encoding if encoding is not None else [],
+                                                    dtype=np.float64).reshape(-1, 128)
+        if encoding is None:
+            failed.append((filename, error))
+    return entries, to_encode, failed
+
+
+def entriesChanged(entries, cached):
+    '''
+    True if syncGalleryEntries added, removed or replaced any entry
+    '''
+    return entries.keys() != cached.keys() or any(entries[k] is not cached[k] for k in entries)
+
+
+def galleryLists(entries):
+    '''
+    (classNames, encodeListKnown) for the entries that have a face
+
+    A person with several stored encodings appears once per encoding,
+    GalleryIndex groups the rows by name again.
+    '''
+    classNames = []
+    encodeListKnown = []
+    for filename, entry in entries.items():
+        name = os.path.splitext(filename)[0]
+        if len(entry['encodings']) == 0:
+            continue
+        classNames.extend([name] * len(entry['encodings']))
+        encodeListKnown.extend(entry['encodings'])
+    return classNames, encodeListKnown
+
+
+def printFailures(failed):
+    '''
+    One report of the gallery images that gave no encoding
+    '''
+    if failed:
+        print(f"Warning: {len(failed)} gallery image(s) not usable:")
+        for filename, reason in failed:
+            print(f"  {filename}: {reason}")
+
+
+def loadGallery(path=None, cache_file=None):
+    '''
+    Load names and encodings for every gallery image, re-encoding only new or changed files
+
+    args:
+    path: str, gallery folder
+    cache_file: str
+
+    returns:
+    (classNames, encodeListKnown, failed): names and encodings with matching order,
+    failed is a list of (file name, reason) for images that gave no encoding
+    '''
+    if path is None:
+        path = config.GALLERY_PATH
+
+    cached = loadCache(cache_file)
+    entries, encoded, failed = syncGalleryEntries(path, cached)
+    if entriesChanged(entries, cached):
+        entries = saveEntries(entries, cache_file)
+    print(f"Gallery cache: {len(entries) - len(encoded)} reused, {len(encoded)} encoded")
+    # Images that had no face last time are only in the cache, report them too
+    failed += [(f, "no usable face (cached result)") for f in sorted(entries)
+               if f not in encoded and len(entries[f]['encodings']) == 0]
+    printFailures(failed)
+    classNames, encodeListKnown = galleryLists(entries)
+    return classNames, encodeListKnown, failed
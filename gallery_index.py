@@ -0,0 +1,228 @@
+import numpy as np
+
+import config
+
+
+class GalleryIndex:
+    '''
+    Known face encodings stored as one contiguous float32 (N,128) matrix
+
+    Replaces the compare_faces + face_distance double pass over a Python list.
+    The squared norms of the gallery rows are computed once, so a query only
+    costs one matrix product:
+
+        |g - q|^2 = |g|^2 + |q|^2 - 2 g.q
+
+    A person may have several rows (one per enrolled pose). aggregation
+    decides how they are combined:
+    "min" keeps every row; the nearest row overall is also the person with
+    the smallest per-person distance, so the min-reduction is free.
+    "centroid" replaces each person's rows by their mean, so the match cost
+    grows with the number of people, not the number of stored encodings.
+
+    args:
+    names: list of names, same order as encodings (repeated for several encodings)
+    encodings: list or array of 128-d encodings
+    aggregation: "min" or "centroid"
+    '''
+
+    def __init__(self, names, encodings, aggregation="min"):
+        self.names = list(names)
+        self.matrix = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, 128))
+        if len(self.names) != len(self.matrix):
+            raise ValueError(f"{len(self.names)} names but {len(self.matrix)} encodings")
+        if aggregation == "centroid" and len(self.names) > len(set(self.names)):
+            identities, row_identity = np.unique(self.names, return_inverse=True)
+            sums = np.zeros((len(identities), 128), dtype=np.float32)
+            np.add.at(sums, row_identity, self.matrix)
+            self.matrix = np.ascontiguousarray(sums / np.bincount(row_identity)[:, None])
+            self.names = [str(n) for n in identities]
+        elif aggregation not in ("min", "centroid"):
+            raise ValueError(f"Unknown gallery aggregation: {aggregation}")
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+    def __len__(self):
+        return len(self.names)
+
+    def distances(self, queries):
+        '''
+        Euclidean distances between queries and every gallery row
+
+        args:
+        queries: (M,128) or (128,) encodings
+
+        returns:
+        (M,N) distance matrix
+        '''
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, 128)
+        q_sq = np.einsum('ij,ij->i', q, q)
+        d2 = self.sq_norms[None, :] + q_sq[:, None] - 2.0 * (q @ self.matrix.T)
+        # Rounding can push d2 of an exact match slightly below zero
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2)
+
+    def matchBatch(self, queries):
+        '''
+        Best gallery row for each query in one batched call
+
+        args:
+        queries: (M,128) encodings
+
+        returns:
+        (indices, distances) arrays of shape (M,), index -1 and distance inf if the gallery is empty
+        '''
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, 128)
+        if len(self) == 0:
+            return np.full(len(q), -1), np.full(len(q), np.inf, dtype=np.float32)
+        dist = self.distances(q)
+        best = np.argmin(dist, axis=1)
+        return best, dist[np.arange(len(q)), best]
+
+    def lookup(self, queries):
+        '''
+        Best gallery name for each query
+
+        returns:
+        (names, distances), the name is None when the gallery is empty
+        '''
+        best, dist = self.matchBatch(queries)
+        return [self.names[i] if i >= 0 else None for i in best], dist
+
+    def match(self, encoding, tolerance=0.4):
+        '''
+        Best match for a single face encoding
+
+        args:
+        encoding: 128-d encoding
+        tolerance: float, maximum distance for a match
+
+        returns:
+        (name, distance), name is None if nothing is within tolerance
+        '''
+        best, dist = self.matchBatch(encoding)
+        if best[0] < 0 or dist[0] >= tolerance:
+            return None, float(dist[0])
+        return self.names[best[0]], float(dist[0])
+
+
+class IVFGalleryIndex(GalleryIndex):
+    '''
+    Approximate gallery search with an inverted-file (IVF) coarse quantizer
+
+    The gallery is clustered with k-means into nlist cells and the rows are
+    reordered so every cell is one contiguous block of the matrix. A query is
+    only compared with the rows of its nprobe closest cells, so the cost per
+    query is roughly nlist + N * nprobe / nlist distances instead of N.
+
+    args:
+    names: list of names, same order as encodings
+    encodings: list or array of 128-d encodings
+    nlist: int, number of cells (default sqrt(N))
+    nprobe: int, cells searched per query, higher = better recall, slower
+    iterations: int, k-means iterations used to train the cells
+    seed: int, random seed for the k-means initialisation
+    aggregation: "min" or "centroid", see GalleryIndex
+    '''
+
+    def __init__(self, names, encodings, nlist=None, nprobe=8, iterations=10, seed=0, aggregation="min"):
+        super().__init__(names, encodings, aggregation)
+        n = len(self)
+        if nlist is None:
+            nlist = int(np.sqrt(n))
+        self.nlist = max(1, min(nlist, n))
+        self.nprobe = nprobe
+        if n == 0:
+            self.centroids = np.zeros((0, 128), dtype=np.float32)
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.order = np.zeros(0, dtype=np.int64)
+            return
+
+        rng = np.random.default_rng(seed)
+        centroids = self.matrix[rng.choice(n, self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = self._nearestCentroid(self.matrix, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, self.matrix)
+            counts = np.bincount(assign, minlength=self.nlist)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        assign = self._nearestCentroid(self.matrix, centroids)
+
+        # Store each cell as one contiguous block, order maps block rows back to names
+        self.order = np.argsort(assign, kind='stable')
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=self.nlist))))
+        self.centroids = centroids
+        self.cell_matrix = np.ascontiguousarray(self.matrix[self.order])
+        self.cell_sq_norms = self.sq_norms[self.order]
+
+    @staticmethod
+    def _nearestCentroid(x, centroids):
+        c_sq = np.einsum('ij,ij->i', centroids, centroids)
+        return np.argmin(c_sq[None, :] - 2.0 * (x @ centroids.T), axis=1)
+
+    def matchBatch(self, queries):
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, 128)
+        best = np.full(len(q), -1)
+        best_dist = np.full(len(q), np.inf, dtype=np.float32)
+        if len(self) == 0:
+            return best, best_dist
+
+        nprobe = max(1, min(self.nprobe, self.nlist))
+        c_sq = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        cell_scores = c_sq[None, :] - 2.0 * (q @ self.centroids.T)
+        probes = np.argpartition(cell_scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        for i in range(len(q)):
+            rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in probes[i]])
+            if len(rows) == 0:
+                continue
+            cand = self.cell_matrix[rows]
+            d2 = self.cell_sq_norms[rows] + q[i] @ q[i] - 2.0 * (cand @ q[i])
+            j = np.argmin(d2)
+            best[i] = self.order[rows[j]]
+            best_dist[i] = np.sqrt(max(d2[j], 0.0))
+        return best, best_dist
+
+
+class LiveGalleryIndex:
+    '''
+    Holds the current gallery index so it can be replaced while recognition runs
+
+    swap() replaces the index with a single attribute assignment. lookup()
+    reads that attribute once, so every query sees one consistent index,
+    either the old one or the new one.
+
+    args:
+    index: GalleryIndex
+    '''
+
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def swap(self, index):
+        self.index = index
+
+    def lookup(self, queries):
+        return self.index.lookup(queries)
+
+
+def buildGalleryIndex(names, encodings, backend=None):
+    '''
+    Create the gallery matcher selected in config.py
+
+    args:
+    names: list of names
+    encodings: list or array of 128-d encodings
+    backend: "exact" or "ivf", defaults to config.MATCHER_BACKEND
+    '''
+    if backend is None:
+        backend = config.MATCHER_BACKEND
+    if backend not in ("exact", "ivf"):
+        raise ValueError(f"Unknown matcher backend: {backend}")
+    if backend == "exact" or len(names) < config.IVF_MIN_GALLERY:
+        return GalleryIndex(names, encodings, config.GALLERY_AGGREGATION)
+    return IVFGalleryIndex(names, encodings, nlist=config.IVF_NLIST, nprobe=config.IVF_NPROBE,
+                           aggregation=config.GALLERY_AGGREGATION)
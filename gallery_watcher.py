@@ -0,0 +1,100 @@
+import os
+import threading
+
+import config
+from gallery import entriesChanged, galleryLists, loadCache, printFailures, saveEntries, syncGalleryEntries
+from gallery_index import buildGalleryIndex
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+
+class GalleryWatcher:
+    '''
+    Picks up gallery changes while main.py is running
+
+    Watches the gallery folder with inotify when the optional inotify_simple
+    package is installed, otherwise polls the file mtimes every
+    poll_seconds. On a change only new or modified images are encoded,
+    deleted ones are dropped, the cache file is updated and a new index is
+    swapped into `live` in one step, so recognition never pauses.
+
+    args:
+    live: LiveGalleryIndex used by the recognition pipeline
+    path: str, gallery folder
+    cache_file: str
+    poll_seconds: float
+    '''
+
+    def __init__(self, live, path=None, cache_file=None, poll_seconds=2.0):
+        self.live = live
+        self.path = path if path is not None else config.GALLERY_PATH
+        self.cache_file = cache_file
+        self.poll_seconds = poll_seconds
+        self.reloads = 0
+        self.entries = loadCache(cache_file)
+        self._signature = self._scan()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gallery-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.poll_seconds + 1.0)
+
+    def _scan(self):
+        # (name, mtime, size) of every gallery file, cheap enough to poll
+        try:
+            return {e.name: (e.stat().st_mtime, e.stat().st_size) for e in os.scandir(self.path)
+                    if e.name.lower().endswith(config.GALLERY_EXTENSIONS)}
+        except OSError:
+            return {}
+
+    def _run(self):
+        if INotify is not None:
+            inotify = INotify()
+            inotify.add_watch(self.path, flags.CREATE | flags.CLOSE_WRITE | flags.DELETE |
+                              flags.MOVED_FROM | flags.MOVED_TO)
+            while not self._stop.is_set():
+                if inotify.read(timeout=int(self.poll_seconds * 1000)):
+                    # Let the writer finish and collect the rest of a burst of events
+                    self._stop.wait(0.5)
+                    inotify.read(timeout=0)
+                    self.refresh()
+            inotify.close()
+        else:
+            while not self._stop.wait(self.poll_seconds):
+                signature = self._scan()
+                if signature != self._signature:
+                    self.refresh()
+
+    def refresh(self):
+        '''
+        Re-sync with the folder and swap in a new index if anything changed
+        '''
+        self._signature = self._scan()
+        # The enrollment tool stores encodings in the cache file, use them instead of re-encoding
+        cached = {**loadCache(self.cache_file), **self.entries}
+        try:
+            # In this process: forking a pool while the capture and pipeline threads run can deadlock
+            entries, encoded, failed = syncGalleryEntries(self.path, cached, workers=1)
+        except OSError as e:
+            # A file vanished between listing and reading, try again next round
+            print(f"Warning: gallery reload failed: {e}")
+            return
+        if not entriesChanged(entries, self.entries):
+            return
+        removed = sorted(self.entries.keys() - entries.keys())
+        # Under the cache lock, an encoding the enrollment tool stored meanwhile is kept
+        entries = saveEntries(entries, self.cache_file)
+        self.entries = entries
+        classNames, encodeListKnown = galleryLists(entries)
+        self.live.swap(buildGalleryIndex(classNames, encodeListKnown))
+        printFailures(failed)
+        self.reloads += 1
+        print(f"Gallery reloaded: {len(encoded)} encoded, {len(removed)} removed, {len(classNames)} faces")
@@ -3,6 +3,10 @@ import face_recognition
 import os
 import numpy as np
 
+import config
+from frame_source import CameraSource
+from gallery import saveEnrolledImage
+
 def calculate_eye_aspect_ratio(eye_landmarks):
     """
     Calculate the eye aspect ratio to detect blinks
@@ -65,7 +69,7 @@ def Intial_data_capture(camera_id=None):
     """
     path = "Attendance_data/"
     if camera_id == None:
-        camera_id = 0  # Use default camera on Windows
+        camera_id = config.CAMERA_INDEX
     
     # Check existing names in the Attendance_data folder
     existing_names = []
@@ -85,7 +89,7 @@ def Intial_data_capture(camera_id=None):
         else:
             break
 
-    camera = cv2.VideoCapture(camera_id)
+    camera = CameraSource(camera_id)
     
     # Constants for detection
     EYE_BLINK_THRESHOLD = 0.25  # Balanced threshold for blink detection
@@ -104,6 +108,9 @@ def Intial_data_capture(camera_id=None):
     last_blink_time = 0
     required_blinks = 3
     
+    # One encoding per confirmed pose, stored together so matching sees the person from several angles
+    pose_encodings = []
+    
     print("\nInstructions:")
     print("Please follow these steps in order:")
     print("1. Look at CENTER for 2 seconds")
@@ -170,6 +177,7 @@ def Intial_data_capture(camera_id=None):
                     elif (current_time - movement_start_time) >= ORIENTATION_HOLD_TIME:
                         orientation_confirmed = True
                         print(f"{required_orientation.upper()} position confirmed!")
+                        pose_encodings.extend(face_recognition.face_encodings(rgb_small, [face_locations[0]]))
                 else:
                     movement_start_time = 0
                 
@@ -264,9 +272,16 @@ def Intial_data_capture(camera_id=None):
                     else:
                         cv2.putText(display_image, "CAPTURING!", (10, 120),
                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                        # Save image
-                        cv2.imwrite(f'{path}{Name}'+'.png', image)
-                        print(f"Image saved successfully with face detected!")
+                        # Encode the face we already found, at the same scale main.py uses,
+                        # so main.py does not have to encode this image again
+                        pose_encodings.extend(face_recognition.face_encodings(rgb_small, [face_locations[0]]))
+                        # Save image, with the pose encodings in a sidecar file next to it
+                        if len(pose_encodings) > 0:
+                            saveEnrolledImage(f'{Name}.png', image, pose_encodings, path)
+                            print(f"Image saved successfully with {len(pose_encodings)} face encodings!")
+                        else:
+                            cv2.imwrite(f'{path}{Name}'+'.png', image)
+                            print(f"Image saved successfully with face detected!")
                         break
         
         # Show the image
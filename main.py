@@ -1,181 +1,160 @@
 
 import cv2
-import numpy as np
-import face_recognition
 import os
-from datetime import datetime
-from datetime import date
-import pytz
-import csv
+import time
 
+import config
+from gallery import listGalleryFiles, loadGallery
+from gallery_index import LiveGalleryIndex, buildGalleryIndex
+from gallery_watcher import GalleryWatcher
+from attendance import AttendanceLog, AttendanceWriter, attendanceFilePath
+from capture import ThreadedCapture
+from frame_source import openSource
+from recognition import buildRecognitionPipeline, drawResults
+from tracker import FaceTracker
+from detection import AdaptiveScaler, DetectionZone, MotionGate, RoiDetector, buildDetector
 
-def identifyEncodings(images, classNames):
-    '''
-    Encoding is Recognition and comparing particular face in database or stored folder
 
-    args:
-    images: list of images
-    classNames: list of image names
-    '''
-    
-    encodeList = []
-    for img, name in zip(images, classNames):
-        small_frame = cv2.resize(img, (0,0), fx=0.25, fy=0.25)
-        img = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-        encodings = face_recognition.face_encodings(img)
-        if len(encodings) > 0:
-            encode = encodings[0]
-            encodeList.append(encode)
-        else:
-            print(f"Warning: No face detected in image for {name}")
-            # Remove the corresponding name from classNames
-            classNames.remove(name)
-            continue
-    return encodeList
-
-def markAttendance(name):
+def markAttendance(name, camera=None):
     '''
-    This function handles attendance marking in CSV file
+    Queue an attendance row, the CSV itself is written by the background AttendanceWriter
     
     args:
     name: str
+    camera: camera id the person was seen on
     '''
-    try:
-        # Ensure the directory exists
-        os.makedirs("Attendance_Entry", exist_ok=True)
-        
-        # Use a fixed filename for today's date
-        now = datetime.now()
-        current_date = now.strftime("%y_%m_%d")
-        attendance_file = f'Attendance_Entry/Attendance_{current_date}.csv'
-        
-        # Create file with headers if it doesn't exist
-        if not os.path.exists(attendance_file):
-            with open(attendance_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["Name", "Time", "Date"])
-        
-        # Record the attendance
-        time_str = now.strftime('%H:%M:%S')
-        date_str = now.strftime('%Y-%m-%d')
-        
-        with open(attendance_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([name, time_str, date_str])
-        print(f"Logged attendance for {name} at {time_str}")
-    
-    except Exception as e:
-        print(f"Error marking attendance: {e}")
-        # If there's an error, try using a backup file
-        try:
-            backup_file = "Attendance_Entry/Attendance_Backup.csv"
-            with open(backup_file, 'a', newline='') as f:
-                writer = csv.writer(f)
-                if f.tell() == 0:  # If file is empty, write header
-                    writer.writerow(["Name", "Time", "Date"])
-                writer.writerow([name, now.strftime('%H:%M:%S'), now.strftime('%Y-%m-%d')])
-            print("Logged to backup file instead")
-        except Exception as backup_error:
-            print(f"Failed to write to backup file: {backup_error}")
+    attendanceWriter.write(name, camera=camera)
 
 # Ensure Attendance_Entry directory exists
-os.makedirs("Attendance_Entry", exist_ok=True)
+os.makedirs(config.ATTENDANCE_DIR, exist_ok=True)
 
 # Create today's attendance file
-current_date = datetime.now().strftime("%y_%m_%d")
-attendance_file = f"Attendance_Entry/Attendance_{current_date}.csv"
-
-# Create file with headers if it doesn't exist
-if not os.path.exists(attendance_file):
-    with open(attendance_file, "w", newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Name", "Time", "Date"])
-    print(f"Created new attendance file for today: {attendance_file}")
-else:
+attendance_file = attendanceFilePath()
+
+# The writer creates the file with headers on the first row of the day
+if os.path.exists(attendance_file):
     print(f"Using today's attendance file: {attendance_file}")
 
-#Preprocessing the data 
-
-path = 'Attendance_data'
-images = []
-classNames = []
-myList = os.listdir(path)
-print(myList)
-# split the data vk.png to vk
-for cl in myList:
-    curImg = cv2.imread(f'{path}/{cl}')
-    images.append(curImg)
-    classNames.append(os.path.splitext(cl)[0])
-print(classNames)
-
-# Encoding of input image data
-encodeListKnown = identifyEncodings(images, classNames)
+# People already marked today are skipped without touching the CSV
+attendanceLog = AttendanceLog(config.ATTENDANCE_COOLDOWN_MINUTES)
+attendanceLog.loadDay(attendance_file)
+
+#Preprocessing the data
+
+path = config.GALLERY_PATH
+print(listGalleryFiles(path))
+
+# Encoding of input image data (only new or changed images are re-encoded)
+classNames, encodeListKnown, _ = loadGallery(path)
+print(sorted(set(classNames)))
 print('Encoding Complete')
-print(f'Successfully encoded {len(encodeListKnown)} faces')
+print(f'Successfully encoded {len(set(classNames))} people ({len(encodeListKnown)} encodings)')
+galleryIndex = LiveGalleryIndex(buildGalleryIndex(classNames, encodeListKnown))
+
+# One writer for all cameras, rows get a Camera column when there is more than one.
+# Started after loadGallery, whose enrollment pool must fork before any thread exists
+cameraSpecs = config.CAMERAS or {None: config.CAMERA_INDEX}
+attendanceWriter = AttendanceWriter(config.ATTENDANCE_FLUSH_SECONDS, config.ATTENDANCE_BATCH_SIZE,
+                                    camera_column=config.CAMERAS is not None)
+
+# Images added or deleted in Attendance_data are picked up without a restart
+galleryWatcher = None
+if config.GALLERY_WATCH:
+    galleryWatcher = GalleryWatcher(galleryIndex, path, poll_seconds=config.GALLERY_POLL_SECONDS).start()
 
 
 #Camera capture 
-cap = cv2.VideoCapture(0)  # Use default camera on Windows
+# Frames of every camera are grabbed on their own thread, the loop always gets the newest one
+caps = {camera: ThreadedCapture(openSource(spec, config.CAMERA_WIDTH, config.CAMERA_HEIGHT, config.CAMERA_FPS))
+        for camera, spec in cameraSpecs.items()}
+
+# Preprocess, detect, encode, match and record each run on their own worker threads,
+# shared by all cameras. Trackers and interval detectors are per camera.
+# A tracked face is only re-encoded every few frames, its identity is carried forward in between
+trackers = None
+if config.TRACKING_ENABLED:
+    trackers = {camera: FaceTracker(config.TRACK_IOU_THRESHOLD, config.TRACK_REVERIFY_FRAMES,
+                                    config.TRACK_UNKNOWN_RETRY_FRAMES, config.TRACK_MAX_MISSES)
+                for camera in caps}
+# Run HOG every few frames, only around the last faces, and move the boxes by template matching in between
+detectors = None
+if config.DETECT_INTERVAL > 1 or config.DETECT_ROI:
+    detectors = {camera: buildDetector() for camera in caps}
+# Detection scale follows the size of the faces in view
+scalers = {camera: AdaptiveScaler(config.DETECT_SCALES, config.DETECT_TARGET_FACE_PX, config.DETECT_MIN_FACE_PX,
+                                  config.DETECT_SCALE_PATIENCE)
+           for camera in caps}
+# Faces outside the doorway zone are not looked for
+zones = None
+if config.DETECT_ZONES:
+    zones = {camera: DetectionZone(polygon) for camera, polygon in config.DETECT_ZONES.items() if camera in caps}
+# HOG idles while nothing moves in front of a camera
+gates = None
+if config.MOTION_GATE:
+    gates = {camera: MotionGate(config.MOTION_PIXEL_THRESHOLD, config.MOTION_MIN_AREA, config.MOTION_HOLD_FRAMES,
+                                config.MOTION_FORCE_SECONDS)
+             for camera in caps}
+pipeline = buildRecognitionPipeline(caps, galleryIndex, attendanceLog, markAttendance, trackers, detectors,
+                                    scalers, zones, gates).start()
+lastSeq = {camera: 0 for camera in caps}
+lastStats = time.time()
 
 while True:
-    success, img = cap.read()
-    small_frame = cv2.resize(img, (0,0), fx=0.25, fy=0.25)
-    imgS = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-
-    #Face recognition using dlib
-    facesCurFrame = face_recognition.face_locations(imgS)
-    
-    # Handle multiple faces detection
-    if len(facesCurFrame) > 1:
-        # Draw warning for multiple faces
-        cv2.putText(img, "WARNING: Multiple faces detected", (10, 30),
-                    cv2.FONT_HERSHEY_COMPLEX, 0.7, (0, 0, 255), 2)
-        # Find the largest face (closest to camera)
-        largest_area = 0
-        largest_face_idx = 0
-        for idx, (top, right, bottom, left) in enumerate(facesCurFrame):
-            area = (right - left) * (bottom - top)
-            if area > largest_area:
-                largest_area = area
-                largest_face_idx = idx
-        # Only keep the largest face
-        facesCurFrame = [facesCurFrame[largest_face_idx]]
-    
-    # Only process if exactly one face is detected
-    if len(facesCurFrame) == 1:
-        encodesCurFrame = face_recognition.face_encodings(imgS, facesCurFrame)
-        
-        for encodeFace, faceLoc in zip(encodesCurFrame, facesCurFrame):
-            matches = face_recognition.compare_faces(encodeListKnown, encodeFace, tolerance=0.4)  # Even stricter tolerance
-            faceDis = face_recognition.face_distance(encodeListKnown, encodeFace)
-            
-        # Only proceed if we have any matches and the best match is very confident
-        if True in matches:
-            matchIndex = np.argmin(faceDis)
-            # Much stricter threshold for acceptance
-            if faceDis[matchIndex] < 0.4:  # Very strict matching threshold
-                confidence = 1 - faceDis[matchIndex]
-                # Only accept if confidence is very high
-                if confidence > 0.6:  # Requires 60% confidence
-                    name = classNames[matchIndex].upper()
-                    print(f"Detected: {name} (Confidence: {confidence:.2%})")
-                    y1, x2, y2, x1 = faceLoc
-                    y1, x2, y2, x1 = y1 * 4, x2 * 4, y2 * 4, x1 * 4
-                    cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                    cv2.rectangle(img, (x1, y2 - 35), (x2, y2), (0, 255, 0), cv2.FILLED)
-                    cv2.putText(img, name, (x1 + 6, y2 - 6), cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2)
-                    markAttendance(name)
-
-    # Show instruction if no face is detected
-    if len(facesCurFrame) == 0:
-        cv2.putText(img, "No face detected", (10, 30),
-                    cv2.FONT_HERSHEY_COMPLEX, 0.7, (0, 255, 255), 2)
-    
-    cv2.imshow('Attendance System', img)
+    job = pipeline.get(timeout=0.5)
+    if job is None:
+        if pipeline.source_ended:
+            print("Failed to grab frame")
+            break
+        if cv2.waitKey(1) & 0xFF == 27: #ESC
+            break
+        continue
+
+    # Parallel workers can finish out of order, never show an older frame
+    camera = job['camera']
+    if job['seq'] < lastSeq[camera]:
+        continue
+    lastSeq[camera] = job['seq']
+
+    img = job['frame']
+    drawResults(img, job)
+
+    cv2.imshow('Attendance System' if camera is None else f'Attendance System - {camera}', img)
     if cv2.waitKey(1) & 0xFF == 27: #ESC
         break
-  
-# After the loop release the cap object
-cap.release()
+
+    if config.PIPELINE_STATS_SECONDS and time.time() - lastStats >= config.PIPELINE_STATS_SECONDS:
+        pipeline.printStats()
+        lastStats = time.time()
+
+pipeline.stop()
+pipeline.printStats()
+if galleryWatcher is not None:
+    galleryWatcher.stop()
+for camera in caps:
+    label = "" if camera is None else f"[{camera}] "
+    if detectors is not None:
+        stats = detectors[camera].stats()
+        print(f"{label}Detector ran on {stats['detector_runs']} of {stats['frames']} frames "
+              f"(HOG {stats['hog_ms']:.1f} ms, propagation {stats['propagate_ms']:.1f} ms, "
+              f"detect step {stats['speedup']:.1f}x faster)")
+        if isinstance(detectors[camera].detect_fn, RoiDetector):
+            stats = detectors[camera].detect_fn.stats()
+            print(f"{label}Full-frame searches: {stats['full_runs']} of {stats['frames']}, "
+                  f"{stats['scanned']:.0%} of the frame searched on average")
+    print(f"{label}Detection scale: {scalers[camera].scale}")
+    if gates is not None:
+        stats = gates[camera].stats()
+        print(f"{label}Motion gate skipped {stats['skipped']:.0%} of {stats['frames']} frames "
+              f"({stats['gate_ms']:.2f} ms per frame)")
+    if trackers is not None:
+        stats = trackers[camera].stats()
+        print(f"{label}Faces seen: {stats['seen']}, encoded: {stats['encoded']} "
+              f"({stats['skipped']:.0%} of encodes skipped by tracking)")
+    # After the loop release the cap object
+    caps[camera].release()
+    stats = caps[camera].stats()
+    print(f"{label}Frames captured: {stats['captured']}, processed: {stats['read']}, dropped: {stats['dropped']}")
+# Write any queued attendance rows
+attendanceWriter.close()
 # Destroy all the windows
 cv2.destroyAllWindows()
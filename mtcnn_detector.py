@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+from mtcnn.mtcnn import MTCNN
+
+
+class MTCNNDetector:
+    '''
+    One MTCNN instance shared by the display loop and the verification worker
+
+    Building MTCNN loads its three networks, so it is done once here and the
+    first (slow, graph-building) call is made on a blank frame at startup.
+    The networks are not safe to call from two threads at once, calls are
+    serialised with a lock. Load, warm-up and per-call times are kept
+    separately, see stats(); the per-call time does not include waiting for
+    the lock.
+
+    args:
+    warmup_size: (width, height) of the blank warm-up frame, None skips the warm-up
+    '''
+
+    def __init__(self, warmup_size=(640, 480)):
+        start = time.perf_counter()
+        self.detector = MTCNN()
+        self.load_seconds = time.perf_counter() - start
+        self.warmup_seconds = 0.0
+        self.latencies = deque(maxlen=10000)
+        self._lock = threading.Lock()
+        if warmup_size is not None:
+            start = time.perf_counter()
+            with self._lock:
+                self.detector.detect_faces(np.zeros((warmup_size[1], warmup_size[0], 3), dtype=np.uint8))
+            self.warmup_seconds = time.perf_counter() - start
+
+    def detect(self, frame, bgr=True):
+        '''
+        MTCNN results ({'box': [x, y, w, h], 'confidence', 'keypoints'}) for one frame
+
+        args:
+        frame: image as read from the camera
+        bgr: bool, convert from OpenCV's BGR to the RGB MTCNN was trained on
+        '''
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if bgr else frame
+        with self._lock:
+            start = time.perf_counter()
+            results = self.detector.detect_faces(rgb)
+            self.latencies.append(time.perf_counter() - start)
+        return results
+
+    def stats(self):
+        '''
+        Model load and warm-up time, and p50/p95 of the detect calls since, in ms
+        '''
+        # A check still running on the worker thread may append meanwhile
+        with self._lock:
+            latencies = list(self.latencies)
+        p50, p95 = np.percentile(latencies, (50, 95)) * 1000 if latencies else (0.0, 0.0)
+        return {
+            'load_ms': self.load_seconds * 1000,
+            'warmup_ms': self.warmup_seconds * 1000,
+            'calls': len(latencies),
+            'p50_ms': p50,
+            'p95_ms': p95,
+        }
@@ -0,0 +1,257 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class Stage:
+    '''
+    One step of the recognition pipeline with its own worker thread(s)
+
+    Workers take a job from the input queue, run fn(job) and put the result
+    on the output queue. Queues are bounded, so a slow stage blocks the one
+    in front of it (backpressure) instead of letting frames pile up. fn may
+    return None to drop a job.
+
+    OpenCV, NumPy and dlib do their heavy work in native code, so several
+    stages running in threads keep more than one core busy.
+
+    With `partition`, every worker gets its own queue and a job always goes
+    to the worker its key partition(job) was assigned to. Keys are spread
+    round-robin in the order given to input.assign(keys), or in order of
+    first appearance. Jobs with the same key (e.g. the same camera) are then
+    handled by one thread, in order, while different keys still share the
+    pool.
+
+    args:
+    name: str, used in the stats
+    fn: callable job -> job or None
+    workers: int, number of threads running fn
+    queue_size: int, capacity of the input queue
+    partition: callable job -> hashable key, or None for one shared queue
+    '''
+
+    def __init__(self, name, fn, workers=1, queue_size=2, partition=None):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        if partition is not None:
+            self.queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+            self.input = PartitionedQueue(self.queues, partition)
+        else:
+            self.input = queue.Queue(maxsize=queue_size)
+            self.queues = [self.input] * workers
+        self.output = None
+        self.processed = 0
+        self.busy_time = 0.0
+        # Recent per-job times for latency percentiles
+        self.latencies = deque(maxlen=10000)
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self, stop_event):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, args=(stop_event, self.queues[i]), name=f"{self.name}-{i}",
+                                 daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def join(self, timeout=None):
+        for t in self._threads:
+            t.join(timeout)
+
+    def _run(self, stop_event, input_queue):
+        while not stop_event.is_set():
+            try:
+                job = input_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            try:
+                result = self.fn(job)
+            except Exception as e:
+                print(f"Error in {self.name} stage: {e}")
+                result = None
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.processed += 1
+                self.busy_time += elapsed
+                self.latencies.append(elapsed)
+            if result is not None and self.output is not None:
+                putUntilStopped(self.output, result, stop_event)
+
+
+class PartitionedQueue:
+    '''
+    Input side of a partitioned Stage, routes each job to one worker queue by key
+    '''
+
+    def __init__(self, queues, partition):
+        self.queues = queues
+        self.partition = partition
+        # Keys get consecutive slots in order of first appearance, so they spread
+        # evenly over the workers (hash() of a str changes from run to run)
+        self.slots = {}
+
+    def assign(self, keys):
+        '''
+        Fix the worker of each key up front, e.g. camera ids in configuration order
+        '''
+        for key in keys:
+            self.slots.setdefault(key, len(self.slots))
+
+    def put(self, item, timeout=None):
+        key = self.partition(item)
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots.setdefault(key, len(self.slots))
+        self.queues[slot % len(self.queues)].put(item, timeout=timeout)
+
+    def qsize(self):
+        return sum(q.qsize() for q in self.queues)
+
+
+def putUntilStopped(q, item, stop_event):
+    '''
+    Blocking put that gives up when the pipeline is stopping
+
+    returns:
+    True if the item was queued
+    '''
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+class Pipeline:
+    '''
+    Chain of Stages fed by one or more frame sources and drained by the caller
+
+    One feeder thread per source reads frames (from a ThreadedCapture) and
+    puts a job dict {'camera', 'seq', 'timestamp', 'frame'} into the first
+    stage, so all cameras share the same stage workers. Results of the last
+    stage land in `output`, which the caller reads, e.g. to draw with
+    cv2.imshow on the main thread.
+
+    args:
+    sources: dict camera id -> object with readLatest(timeout) -> (success, frame, seq, timestamp)
+             and ended, or a single such object (camera id None)
+    stages: list of Stage in processing order
+    output_size: int, capacity of the output queue
+    '''
+
+    def __init__(self, sources, stages, output_size=2):
+        if not isinstance(sources, dict):
+            sources = {None: sources}
+        self.sources = sources
+        self.stages = stages
+        self.output = queue.Queue(maxsize=output_size)
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.output = next_stage.input
+        stages[-1].output = self.output
+        self.frames_in = {camera: 0 for camera in sources}
+        self._stop = threading.Event()
+        self._start_time = None
+        self._feeders = [threading.Thread(target=self._feed, args=(camera, source), name=f"feeder-{camera}",
+                                          daemon=True)
+                         for camera, source in sources.items()]
+
+    @property
+    def source_ended(self):
+        '''
+        True once every source stopped delivering frames
+        '''
+        return all(source.ended for source in self.sources.values())
+
+    def start(self):
+        self._start_time = time.perf_counter()
+        for stage in self.stages:
+            stage.start(self._stop)
+        for feeder in self._feeders:
+            feeder.start()
+        return self
+
+    def _feed(self, camera, source):
+        while not self._stop.is_set():
+            success, frame, seq, timestamp = source.readLatest(timeout=0.5)
+            if not success:
+                if source.ended:
+                    return
+                continue
+            job = {'camera': camera, 'seq': seq, 'timestamp': timestamp, 'frame': frame}
+            if putUntilStopped(self.stages[0].input, job, self._stop):
+                self.frames_in[camera] += 1
+
+    def get(self, timeout=None):
+        '''
+        Next finished job, None on timeout
+        '''
+        try:
+            return self.output.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        self._stop.set()
+        for feeder in self._feeders:
+            feeder.join(timeout=2.0)
+        for stage in self.stages:
+            stage.join(timeout=2.0)
+
+    def stats(self, elapsed=None):
+        '''
+        Per-stage throughput and queue depth
+
+        args:
+        elapsed: float seconds the rates are computed over, defaults to the time since start()
+
+        returns:
+        list of dicts with name, processed, fps, busy_ms (mean time per job),
+        utilisation (busy time / wall time / workers) and queue (input depth)
+        '''
+        if elapsed is None:
+            elapsed = time.perf_counter() - self._start_time if self._start_time else 0.0
+        elapsed = max(elapsed, 1e-9)
+        rows = []
+        for stage in self.stages:
+            with stage._lock:
+                processed = stage.processed
+                busy = stage.busy_time
+            rows.append({
+                'name': stage.name,
+                'processed': processed,
+                'fps': processed / elapsed,
+                'busy_ms': busy / processed * 1000 if processed else 0.0,
+                'utilisation': busy / elapsed / stage.workers,
+                'queue': stage.input.qsize(),
+            })
+        return rows
+
+    def latencyPercentiles(self, percentiles=(50, 95, 99)):
+        '''
+        Per-stage latency percentiles in milliseconds over the recent jobs
+
+        returns:
+        dict stage name -> list of values in the order of `percentiles`
+        '''
+        result = {}
+        for stage in self.stages:
+            with stage._lock:
+                samples = np.array(stage.latencies)
+            if len(samples):
+                result[stage.name] = list(np.percentile(samples, percentiles) * 1000)
+            else:
+                result[stage.name] = [0.0] * len(percentiles)
+        return result
+
+    def printStats(self, elapsed=None):
+        print(f"{'stage':<12}{'jobs':>8}{'fps':>8}{'ms/job':>9}{'busy':>7}{'queue':>7}")
+        for row in self.stats(elapsed):
+            print(f"{row['name']:<12}{row['processed']:>8}{row['fps']:>8.1f}{row['busy_ms']:>9.1f}"
+                  f"{row['utilisation']:>7.0%}{row['queue']:>7}")
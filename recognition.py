@@ -0,0 +1,246 @@
+import cv2
+import face_recognition
+
+import config
+from pipeline import Pipeline, Stage
+
+
+def scaleBoxes(boxes, factor):
+    '''
+    (top, right, bottom, left) boxes multiplied by factor, as ints
+    '''
+    return [tuple(int(round(v * factor)) for v in box) for box in boxes]
+
+
+def frameBoxes(job, boxes):
+    '''
+    Boxes found in job['small'] mapped back to the coordinates of job['frame']
+    '''
+    x, y = job['offset']
+    return [(top + y, right + x, bottom + y, left + x)
+            for top, right, bottom, left in scaleBoxes(boxes, 1 / job['scale'])]
+
+
+def makePreprocessStage(scalers=None, zones=None):
+    '''
+    Stage function cropping to the detection zone, downscaling and converting BGR to RGB for dlib
+
+    Adds job['small'], job['scale'], the factor it was made with,
+    job['offset'], the (x, y) of the crop in the frame, and job['zone'].
+    frameBoxes maps boxes found in job['small'] back to the frame.
+
+    args:
+    scalers: dict camera id -> AdaptiveScaler, None keeps the fixed quarter size
+    zones: dict camera id -> DetectionZone, cameras without one use the whole frame
+    '''
+    def preprocessFrame(job):
+        camera = job['camera']
+        job['scale'] = scalers[camera].scale if scalers is not None else 0.25
+        job['zone'] = zones.get(camera) if zones is not None else None
+        if job['zone'] is not None:
+            frame, job['offset'] = job['zone'].crop(job['frame'])
+        else:
+            frame, job['offset'] = job['frame'], (0, 0)
+        small_frame = cv2.resize(frame, (0,0), fx=job['scale'], fy=job['scale'])
+        job['small'] = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        return job
+    return preprocessFrame
+
+
+def makeDetectStage(detectors=None, scalers=None, gates=None):
+    '''
+    Stage function running face detection on the small frame
+
+    Every face is kept, except those outside the camera's detection zone.
+    Frames the camera's motion gate holds back get no faces and
+    job['detected'] False without running the detector.
+
+    args:
+    detectors: dict camera id -> IntervalDetector, None runs face_locations on every frame
+    scalers: dict camera id -> AdaptiveScaler, told the face sizes to pick the next scale
+    gates: dict camera id -> MotionGate, None detects on every frame
+    '''
+    lastFaces = {}
+    gated = set()
+
+    def detectFaces(job):
+        camera = job['camera']
+        if gates is not None and not gates[camera](job['small'], job['timestamp'], bool(lastFaces.get(camera))):
+            facesCurFrame, job['detected'] = [], False
+            gated.add(camera)
+        elif detectors is not None:
+            if camera in gated:
+                # Something moved after a quiet spell, detect now instead of waiting for the interval
+                detectors[camera].reset()
+                gated.discard(camera)
+            facesCurFrame, job['detected'] = detectors[camera](job['small'])
+        else:
+            facesCurFrame, job['detected'] = face_recognition.face_locations(job['small']), True
+        if job['zone'] is not None:
+            facesCurFrame = [face for face, box in zip(facesCurFrame, frameBoxes(job, facesCurFrame))
+                             if job['zone'].contains(box)]
+        job['faces'] = facesCurFrame
+        lastFaces[camera] = facesCurFrame
+        if scalers is not None:
+            scalers[camera].update(facesCurFrame, job['scale'])
+        return job
+    return detectFaces
+
+
+def makeTrackStage(trackers):
+    '''
+    Stage function assigning track IDs and choosing which faces to encode
+
+    Adds job['tracks'] (one Track per face) and job['encode_idx'].
+    Frames arriving out of order from the parallel detectors are dropped,
+    each camera's tracker has to see its frames in sequence. Boxes are
+    tracked in frame coordinates, so a change of detection scale keeps the
+    tracks.
+
+    args:
+    trackers: dict camera id -> FaceTracker
+    '''
+    lastSeq = {}
+
+    def trackFaces(job):
+        camera = job['camera']
+        if job['seq'] < lastSeq.get(camera, 0):
+            return None
+        lastSeq[camera] = job['seq']
+        job['tracks'], job['encode_idx'] = trackers[camera].update(frameBoxes(job, job['faces']))
+        return job
+    return trackFaces
+
+
+def encodeFaces(job):
+    '''
+    128-d dlib encodings of the faces listed in job['encode_idx'] (all faces without a tracker)
+
+    All faces of the frame go through a single face_encodings call.
+    '''
+    if 'encode_idx' not in job:
+        job['encode_idx'] = list(range(len(job['faces'])))
+    faces = [job['faces'][i] for i in job['encode_idx']]
+    if faces:
+        job['encodings'] = face_recognition.face_encodings(job['small'], faces)
+    else:
+        job['encodings'] = []
+    return job
+
+
+def makeMatchStage(galleryIndex, trackers=None, tolerance=0.4):
+    '''
+    Stage function matching every encoding against the gallery in one batched call
+
+    Adds job['matches'], a list of (faceLoc, name, distance) for the faces that
+    passed the tolerance and the 60% confidence check. With a tracker, faces
+    that were not encoded this frame reuse the identity of their track.
+    '''
+    def matchFaces(job):
+        job['matches'] = []
+        results = {}
+        tracker = trackers[job['camera']] if trackers is not None else None
+        if job['encodings']:
+            names, dist = galleryIndex.lookup(job['encodings'])
+            for i, name, matchDis in zip(job['encode_idx'], names, dist):
+                # Very strict matching threshold and requires 60% confidence
+                if name is not None and matchDis < tolerance and 1 - matchDis > 0.6:
+                    results[i] = (name.upper(), float(matchDis))
+                else:
+                    results[i] = (None, float(matchDis))
+                if tracker is not None:
+                    tracker.setIdentity(job['tracks'][i], *results[i])
+
+        for i, faceLoc in enumerate(job['faces']):
+            if i in results:
+                name, matchDis = results[i]
+            elif tracker is not None:
+                name, matchDis = job['tracks'][i].name, job['tracks'][i].distance
+            else:
+                continue
+            if name is not None:
+                job['matches'].append((faceLoc, name, matchDis))
+        return job
+    return matchFaces
+
+
+def makeRecordStage(attendanceLog, markAttendance):
+    '''
+    Stage function sending recognised people to the attendance writer
+
+    Runs in a single worker, so the seen-set is shared by all cameras and a
+    person walking past two entrances is only marked once.
+    '''
+    def recordAttendance(job):
+        for _, name, matchDis in job['matches']:
+            print(f"Detected: {name} (Confidence: {1 - matchDis:.2%})")
+            if attendanceLog.shouldMark(name):
+                markAttendance(name, job['camera'])
+        return job
+    return recordAttendance
+
+
+def buildRecognitionPipeline(sources, galleryIndex, attendanceLog, markAttendance, trackers=None, detectors=None,
+                             scalers=None, zones=None, gates=None):
+    '''
+    capture -> preprocess -> detect -> [track] -> encode -> match -> record, one Stage each
+
+    All cameras share the stage workers and the read-only gallery matrix.
+    Trackers, interval detectors, scalers, zones and motion gates are per
+    camera, so they are passed as dicts keyed by camera id.
+
+    args:
+    sources: dict camera id -> ThreadedCapture, or a single capture
+    galleryIndex: GalleryIndex or LiveGalleryIndex
+    attendanceLog: AttendanceLog
+    markAttendance: callable(name, camera)
+    trackers: dict camera id -> FaceTracker, or None to encode every face on every frame
+    detectors: dict camera id -> IntervalDetector, or None to run HOG on every frame
+    scalers: dict camera id -> AdaptiveScaler, or None for the fixed quarter-size frame
+    zones: dict camera id -> DetectionZone, or None to detect in the whole frame
+    gates: dict camera id -> MotionGate, or None to detect on every frame
+    '''
+    size = config.PIPELINE_QUEUE_SIZE
+    camera_count = len(sources) if isinstance(sources, dict) else 1
+    if detectors is not None or gates is not None:
+        # Interval detectors and motion gates keep state between frames and need them in order:
+        # each camera is pinned to one detect worker
+        detect_stage = Stage("detect", makeDetectStage(detectors, scalers, gates),
+                             workers=min(config.DETECT_WORKERS, camera_count),
+                             queue_size=size, partition=lambda job: job['camera'])
+        # Cameras in configuration order, so two cameras on two workers never share one
+        detect_stage.input.assign(sources if isinstance(sources, dict) else [None])
+    else:
+        detect_stage = Stage("detect", makeDetectStage(None, scalers), workers=config.DETECT_WORKERS, queue_size=size)
+    stages = [
+        Stage("preprocess", makePreprocessStage(scalers, zones), queue_size=size),
+        detect_stage,
+    ]
+    if trackers is not None:
+        stages.append(Stage("track", makeTrackStage(trackers), queue_size=size))
+    stages += [
+        Stage("encode", encodeFaces, workers=config.ENCODE_WORKERS, queue_size=size),
+        Stage("match", makeMatchStage(galleryIndex, trackers), queue_size=size),
+        Stage("record", makeRecordStage(attendanceLog, markAttendance), queue_size=size),
+    ]
+    return Pipeline(sources, stages, output_size=size)
+
+
+def drawResults(img, job):
+    '''
+    Draw boxes, names and warnings of a finished job onto the full-size frame
+    '''
+    if job['zone'] is not None:
+        cv2.polylines(img, [job['zone'].points.reshape(-1, 1, 2)], True, (255, 200, 0), 1)
+    if len(job['faces']) > 1:
+        cv2.putText(img, f"{len(job['faces'])} faces detected", (10, 30),
+                    cv2.FONT_HERSHEY_COMPLEX, 0.7, (0, 255, 255), 2)
+    for faceLoc, name, _ in job['matches']:
+        y1, x2, y2, x1 = frameBoxes(job, [faceLoc])[0]
+        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.rectangle(img, (x1, y2 - 35), (x2, y2), (0, 255, 0), cv2.FILLED)
+        cv2.putText(img, name, (x1 + 6, y2 - 6), cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2)
+    # Show instruction if no face is detected
+    if len(job['faces']) == 0:
+        cv2.putText(img, "No face detected", (10, 30),
+                    cv2.FONT_HERSHEY_COMPLEX, 0.7, (0, 255, 255), 2)
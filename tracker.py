@@ -0,0 +1,148 @@
+import threading
+
+
+def boxIoU(a, b):
+    '''
+    Intersection over union of two (top, right, bottom, left) boxes
+    '''
+    top = max(a[0], b[0])
+    right = min(a[1], b[1])
+    bottom = min(a[2], b[2])
+    left = max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    '''
+    One face followed across frames
+
+    name/distance hold the last gallery match (name None = not recognised).
+    '''
+
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.name = None
+        self.distance = None
+        self.verified = False
+        self.pending = False
+        self.pending_frames = 0
+        self.frames_since_verify = 0
+        self.misses = 0
+
+
+class FaceTracker:
+    '''
+    IoU tracker that decides which faces actually need a dlib encoding
+
+    Detected boxes are matched greedily to the existing tracks by IoU. A track
+    is sent to the encoder when it is new, every reverify_frames frames after
+    it was recognised, and every unknown_retry_frames frames while it is still
+    unrecognised. In between, the last identity is carried forward. Tracks not
+    seen for max_misses frames are dropped.
+
+    args:
+    iou_threshold: float, minimum IoU to continue a track
+    reverify_frames: int
+    unknown_retry_frames: int
+    max_misses: int
+    '''
+
+    def __init__(self, iou_threshold=0.3, reverify_frames=30, unknown_retry_frames=5, max_misses=5):
+        self.iou_threshold = iou_threshold
+        self.reverify_frames = reverify_frames
+        self.unknown_retry_frames = unknown_retry_frames
+        self.max_misses = max_misses
+        self.tracks = []
+        self.faces_seen = 0
+        self.faces_encoded = 0
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def update(self, boxes):
+        '''
+        Associate this frame's boxes with tracks
+
+        args:
+        boxes: list of (top, right, bottom, left)
+
+        returns:
+        (tracks, encode_idx): the track of every box in the same order, and the
+        indices of the boxes that need to be encoded this frame
+        '''
+        with self._lock:
+            pairs = []
+            for i, box in enumerate(boxes):
+                for j, track in enumerate(self.tracks):
+                    iou = boxIoU(box, track.box)
+                    if iou >= self.iou_threshold:
+                        pairs.append((iou, i, j))
+            pairs.sort(reverse=True)
+
+            assigned = [None] * len(boxes)
+            used = set()
+            for _, i, j in pairs:
+                if assigned[i] is None and j not in used:
+                    assigned[i] = self.tracks[j]
+                    used.add(j)
+
+            for j, track in enumerate(self.tracks):
+                if j not in used:
+                    track.misses += 1
+            self.tracks = [t for j, t in enumerate(self.tracks) if j in used or t.misses <= self.max_misses]
+
+            encode_idx = []
+            for i, box in enumerate(boxes):
+                track = assigned[i]
+                if track is None:
+                    track = Track(self._next_id, box)
+                    self._next_id += 1
+                    self.tracks.append(track)
+                    assigned[i] = track
+                track.box = box
+                track.misses = 0
+                track.frames_since_verify += 1
+                if track.pending:
+                    # The job carrying this face may have been dropped, ask again
+                    track.pending_frames += 1
+                    if track.pending_frames > self.reverify_frames:
+                        track.pending = False
+
+                limit = self.reverify_frames if track.name is not None else self.unknown_retry_frames
+                if not track.pending and (not track.verified or track.frames_since_verify >= limit):
+                    track.pending = True
+                    track.pending_frames = 0
+                    encode_idx.append(i)
+
+            self.faces_seen += len(boxes)
+            self.faces_encoded += len(encode_idx)
+            return assigned, encode_idx
+
+    def setIdentity(self, track, name, distance):
+        '''
+        Store the result of a gallery match for a track
+
+        args:
+        track: Track
+        name: str or None
+        distance: float
+        '''
+        with self._lock:
+            track.name = name
+            track.distance = distance
+            track.verified = True
+            track.pending = False
+            track.frames_since_verify = 0
+
+    def stats(self):
+        '''
+        Dict with faces seen, faces encoded and the fraction of encodes skipped
+        '''
+        with self._lock:
+            skipped = 1 - self.faces_encoded / self.faces_seen if self.faces_seen else 0.0
+            return {'seen': self.faces_seen, 'encoded': self.faces_encoded,
+                    'skipped': skipped, 'tracks': len(self.tracks)}
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+
+# value is whatever fn returned, timestamp the capture time of the frame and
+# finished the time the check completed (both time.time() seconds)
+CheckResult = namedtuple('CheckResult', ['seq', 'timestamp', 'finished', 'value'])
+
+
+class LatestFrameWorker:
+    '''
+    Runs a slow check on one background thread, always on the newest frame submitted
+
+    The DeepFace scripts used to start a new thread every 30 frames, with no
+    limit on how many ran at once. Here there is one worker thread and a
+    single pending slot: submitting while a frame is still waiting replaces
+    it (counted in frames_dropped), so at most one check runs and one waits,
+    whatever the speed of the check.
+
+    Results go into a slot the display loop reads without waiting: a
+    CheckResult with the sequence number and capture time of the frame it
+    was computed on. An older result never replaces a newer one. The time
+    from capture to result is kept for stats().
+
+    args:
+    fn: callable frame -> result, run on the worker thread
+    name: str, thread name
+    '''
+
+    def __init__(self, fn, name="verify"):
+        self.fn = fn
+        self.frames_submitted = 0
+        self.frames_checked = 0
+        self.frames_dropped = 0
+        self.latencies = deque(maxlen=1000)
+        self._pending = None
+        self._result = CheckResult(-1, None, None, None)
+        self._running = True
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, seq, frame, timestamp=None):
+        '''
+        Queue a frame for checking, replacing one that has not started yet
+
+        args:
+        seq: int, frame sequence number, increasing
+        frame: image, must not be modified by the caller afterwards (pass a copy)
+        timestamp: float, time.time() the frame was captured, defaults to now
+        '''
+        if timestamp is None:
+            timestamp = time.time()
+        with self._cond:
+            if self._pending is not None:
+                self.frames_dropped += 1
+            self._pending = (seq, frame, timestamp)
+            self.frames_submitted += 1
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    return
+                seq, frame, timestamp = self._pending
+                self._pending = None
+            try:
+                value = self.fn(frame)
+            except Exception as e:
+                print(f"Warning: check of frame {seq} failed: {e}")
+                value = None
+            finished = time.time()
+            with self._cond:
+                self.frames_checked += 1
+                self.latencies.append(finished - timestamp)
+                if seq > self._result.seq:
+                    self._result = CheckResult(seq, timestamp, finished, value)
+
+    def result(self):
+        '''
+        CheckResult of the newest finished check, seq is -1 before the first one
+        '''
+        with self._cond:
+            return self._result
+
+    def stats(self):
+        '''
+        Frame counters and p50/p95 of the time from capture to result, in ms
+        '''
+        with self._cond:
+            latencies = list(self.latencies)
+            p50, p95 = np.percentile(latencies, (50, 95)) * 1000 if latencies else (0.0, 0.0)
+            return {
+                'submitted': self.frames_submitted,
+                'checked': self.frames_checked,
+                'dropped': self.frames_dropped,
+                'p50_ms': p50,
+                'p95_ms': p95,
+            }
+
+    def close(self):
+        '''
+        Stop the worker, a check that is running is left to finish in the background
+        '''
+        with self._cond:
+            self._running = False
+            self._cond.notify()